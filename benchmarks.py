@@ -0,0 +1,417 @@
+"""
+Microbenchmarks da Calculadora RPN.
+
+Uso: python3 benchmarks.py [operadores|threads|perfis|observacao|retomada] [--repeticoes N]
+                            [--threads 1,2,4,8] [--linhas N] [--edicoes N]
+
+operadores: para cada operador, compara o tempo por chamada de `operate` (genérico,
+com as verificações `a == int(a)`), da operação especializada escolhida pela inferência
+de tipos de main.py e da operação do perfil otimizado (main_optimized.py). Mede também
+a avaliação da linha `(a b op)`, com e sem especialização.
+
+threads: avalia muitos escopos independentes contra um único RPNEngine com pools
+de 1, 2, 4... threads e mede a vazão. Em builds com GIL a vazão fica estável;
+em builds sem GIL (free-threaded) deve crescer com o número de threads.
+
+perfis: conformidade e vazão. Gera um corpus (válido e inválido nos dois perfis) e
+o avalia, com cada perfil de semântica, por todos os caminhos do motor — linha a linha,
+em bloco, compilado, com memorização e verboso — comparando cada um com a referência
+(linha a linha, sem especialização por tipo). Uma otimização do motor vale para os dois
+perfis e é conferida contra as duas semânticas; qualquer divergência encerra com erro.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+
+# Operandos inteiros (como os literais de main.py, reais com valor inteiro)
+OPERANDS = {
+    '+': (1234.0, 5678.0),
+    '-': (1234.0, 5678.0),
+    '*': (1234.0, 5678.0),
+    '|': (1234.0, 56.0),
+    '/': (1234.0, 56.0),
+    '%': (1234.0, 56.0),
+    '^': (3.0, 20.0),
+}
+
+
+def _time_per_call(func, number, repeat):
+    """Melhor tempo por chamada, em nanossegundos."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e9
+
+
+def _parse(calc, line):
+    calc.tokens = calc._custom_tokenize(line)
+    calc.token_index = 0
+    calc.token_end = len(calc.tokens)
+    return calc.parse_line_to_ast()
+
+
+def _strip_specialization(node):
+    """Remove as operações especializadas, forçando `operate` genérico."""
+    if isinstance(node, main.BinOpNode):
+        node.op_func = None
+    for child in node.children:
+        _strip_specialization(child)
+
+
+def bench_operators(number=200000, repeat=5):
+    calc = main.RPNCalculator(verbose=False)
+    optimized = main.RPNCalculator.PROFILES['otimizado'].operations
+    print(f"{'op':<3} {'operate':>10} {'especial.':>10} {'optimized':>10} {'linha':>10} {'linha esp.':>10}  (ns)")
+    for op, (a, b) in OPERANDS.items():
+        int_func, _ = calc.SPECIALIZED_OPERATIONS[op]
+        generic = _time_per_call(lambda: calc.operate(a, b, op), number, repeat)
+        special = _time_per_call(lambda: int_func(a, b), number, repeat)
+        opt_func = optimized[op]
+        opt = _time_per_call(lambda: opt_func(int(a), int(b)), number, repeat)
+
+        # Avaliação da AST de uma linha com o operador, com e sem especialização
+        line = f"({int(a)} {int(b)} {op})"
+        ast = _parse(calc, line)
+        plain = _parse(calc, line)
+        _strip_specialization(plain)
+        calc._start_budget()
+        line_special = _time_per_call(lambda: calc.evaluate_ast(ast), number // 10, repeat)
+        line_plain = _time_per_call(lambda: calc.evaluate_ast(plain), number // 10, repeat)
+        print(f"{op:<3} {generic:>10.1f} {special:>10.1f} {opt:>10.1f} {line_plain:>10.1f} {line_special:>10.1f}")
+
+
+def _make_scopes(count, lines_per_scope, seed=6):
+    """Escopos sintéticos: operações, RES, MEM, células nomeadas e pequenos laços."""
+    rng = random.Random(seed)
+    scopes = []
+    for _ in range(count):
+        lines = []
+        for _ in range(lines_per_scope):
+            a, b = rng.randint(1, 99), rng.randint(1, 99)
+            lines.append(rng.choice([
+                f"({a} {b} +)", f"(({a} {b} *) ({b} 3 %) -)", f"({a} MEM)", f"((MEM) {b} /)",
+                f"((0 RES) {a} |)", f"({a} x MEM)", f"((x MEM) (1 RES) +)",
+                f"(PARA i DE 1 ATE {b} (i {a} *))", f"(SE ({a} {b} -) ENTAO {a} SENAO {b})",
+            ]))
+        scopes.append(lines)
+    return scopes
+
+
+def bench_threads(thread_counts=(1, 2, 4, 8), scopes=64, lines_per_scope=2000):
+    engine = main.RPNEngine()
+    work = _make_scopes(scopes, lines_per_scope)
+    total = scopes * lines_per_scope
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"{scopes} escopos x {lines_per_scope} linhas, GIL {'ativo' if gil else 'desativado'}")
+    expected = None
+    base = None
+    for threads in thread_counts:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.perf_counter()
+            outputs = list(pool.map(engine.evaluate_many, work))
+            elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = outputs
+        elif outputs != expected: # Escopos independentes: o resultado não pode depender das threads
+            raise AssertionError(f"Resultados divergentes com {threads} threads")
+        base = base or elapsed
+        print(f"{threads:>3} thread(s): {total / elapsed:>10.0f} linhas/s  (aceleração {base / elapsed:.2f}x)")
+
+
+def _make_corpus(count, seed=44):
+    """
+        Linhas sintéticas com as construções dos dois perfis: negativos, reais, (N),
+        SE/PARA aninhados, variáveis de laço, células nomeadas, RES, MEM e erros.
+    """
+    rng = random.Random(seed)
+
+    def number():
+        return rng.choice([str(rng.randint(0, 40)), str(rng.randint(-40, -1)), f"{rng.randint(0, 9)}.5",
+                           "40000", "0", "2"])
+
+    def expr(depth):
+        r = rng.random()
+        if depth == 0 or r < 0.25:
+            return number()
+        if r < 0.33:
+            return f"({number()})"
+        if r < 0.40:
+            return "(MEM)"
+        if r < 0.46:
+            return f"({expr(depth - 1)} MEM)"
+        if r < 0.52:
+            return f"({rng.randint(-1, 4)} RES)"
+        if r < 0.60:
+            tail = f" SENAO {expr(depth - 1)})" if rng.random() < 0.6 else ")"
+            return f"(SE {expr(depth - 1)} ENTAO {expr(depth - 1)}{tail}"
+        if r < 0.66:
+            return f"(PARA {rng.randint(0, 3)} DE {rng.randint(-2, 2)} ATE {rng.randint(0, 6)} {expr(depth - 1)})"
+        if r < 0.69:
+            return f"(PARA i DE 1 ATE {rng.randint(1, 9)} (i {number()} *))"
+        if r < 0.71:
+            return f"({number()} x MEM)"
+        if r < 0.74:
+            return f"({expr(depth - 1)} {rng.randint(0, 3)} ^)" # Expoente pequeno: potências exatas rápidas
+        return f"({expr(depth - 1)} {expr(depth - 1)} {rng.choice('+-*|/%')})"
+
+    lines = []
+    for _ in range(count):
+        line = expr(3)
+        r = rng.random()
+        if r < 0.04:
+            line = line.replace(')', '', 1)
+        elif r < 0.06:
+            line += " ?"
+        elif r < 0.08:
+            line = "  " + line
+        lines.append(line)
+    return lines
+
+
+def _reference_results(profile, lines):
+    """Referência: cada linha tokenizada e avaliada sozinha, com `operate` genérico."""
+    calc = main.RPNCalculator(verbose=False, profile=profile)
+    out = []
+    for line_num, line in enumerate(lines, 1):
+        content = line.strip()
+        calc.current_line_num = line_num
+        try:
+            ast = calc._parse_source(content)
+            if calc.profile.operations is None:
+                _strip_specialization(ast)
+            out.append((line_num, calc._evaluate_line_ast(ast), None))
+        except Exception as e:
+            out.append((line_num, None, str(e)))
+    return out
+
+
+def _verbose_results(profile, lines):
+    calc = main.RPNCalculator(profile=profile)
+    out = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for line_num, line in enumerate(lines, 1):
+            calc.current_line_num = line_num
+            out.append((line_num, calc.evaluate_expression(line), calc.last_error))
+    return out
+
+
+def _conforms(got, expected, lexical_prefix):
+    """
+        Mesmo resultado e mesmo erro. Uma linha com erro léxico e sintático pode reportar
+        qualquer um dos dois: o cursor sob demanda encontra primeiro o que vier antes na
+        linha, a tokenização em bloco (e a do modo verboso otimizado) sempre o léxico.
+    """
+    if got == expected:
+        return True
+    (_, _, got_error), (_, _, expected_error) = got, expected
+    return (got[:2] == expected[:2] and got_error is not None and expected_error is not None
+            and (got_error.startswith(lexical_prefix) or expected_error.startswith(lexical_prefix)))
+
+
+def bench_profiles(lines=5000):
+    corpus = _make_corpus(lines)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(corpus) + "\n")
+        paths = {
+            'referência': lambda p: _reference_results(p, corpus),
+            'linhas': lambda p: main.RPNCalculator(verbose=False, profile=p).evaluate_many(corpus),
+            'bloco': lambda p: main.RPNCalculator(verbose=False, profile=p).evaluate_many(path),
+            'compilado': lambda p: main.RPNCalculator(verbose=False, compiled=True, profile=p).evaluate_many(path),
+            'memo': lambda p: main.RPNCalculator(verbose=False, memo_size=1024, profile=p).evaluate_many(path),
+            'verboso': lambda p: _verbose_results(p, corpus),
+        }
+        print(f"Corpus: {lines} linhas")
+        print(f"{'perfil':<10} {'caminho':<11} {'linhas/s':>10}  conformidade")
+        divergent = []
+        for profile in main.RPNCalculator.PROFILES:
+            expected = None
+            lexical_prefix = main.RPNCalculator.PROFILES[profile].messages['char'].split(':')[0]
+            for name, run in paths.items():
+                start = time.perf_counter()
+                results = [(n, repr(r), e) for n, r, e in run(profile)] # repr distingue 4 de 4.0
+                elapsed = time.perf_counter() - start
+                if expected is None:
+                    expected = results
+                    errors = sum(1 for _, _, e in results if e)
+                    status = f"referência ({errors} erro(s))"
+                else:
+                    bad = (sum(1 for a, b in zip(results, expected) if not _conforms(a, b, lexical_prefix))
+                           + abs(len(results) - len(expected)))
+                    status = "ok" if not bad else f"DIVERGE em {bad} linha(s)"
+                    if bad:
+                        divergent.append((profile, name))
+                print(f"{profile:<10} {name:<11} {lines / elapsed:>10.0f}  {status}")
+    if divergent:
+        raise AssertionError(f"Caminhos divergentes da referência: {divergent}")
+
+
+def _watch_state(calc):
+    """
+        Resultado de cada linha não vazia, RES e memória do modo --watch. A mensagem de
+        erro de uma linha deslocada só é refeita ao imprimir: o número da linha é ignorado.
+    """
+    lines = [(repr(r.result), None if r.error is None else re.sub(r"linha \d+", "linha N", r.error))
+             for r in calc._watch_lines if not r.is_blank()]
+    return lines, repr(calc.results), repr(calc._memory_state())
+
+
+def bench_watch(lines=2000, edits=300, seed=27):
+    corpus = _make_corpus(lines + edits, seed)
+    pool, texts = corpus[lines:], corpus[:lines]
+    rng = random.Random(seed)
+    incremental = main.RPNCalculator()
+    incremental_time = full_time = 0.0
+    reevaluated = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        incremental._watch_update(texts)
+        for edit in range(edits):
+            texts = list(texts)
+            r, i = rng.random(), rng.randrange(len(texts))
+            if r < 0.4:
+                texts[i] = rng.choice(pool)
+            elif r < 0.7:
+                texts.insert(i, rng.choice(pool))
+            elif len(texts) > 1:
+                del texts[i]
+            start = time.perf_counter()
+            reevaluated += incremental._watch_update(texts)
+            incremental_time += time.perf_counter() - start
+            start = time.perf_counter()
+            full = main.RPNCalculator()
+            full._watch_update(texts)
+            full_time += time.perf_counter() - start
+            if _watch_state(incremental) != _watch_state(full):
+                raise AssertionError(f"Estado incremental diverge da reavaliação completa na edição {edit + 1}")
+
+        # Salvamento por renomeação: o arquivo some por um instante e volta com outro conteúdo
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "observado.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("(1 2 +)\n")
+            signature, _ = incremental._watch_read(path, None)
+            os.remove(path)
+            if incremental._watch_read(path, signature) is not None:
+                raise AssertionError("Arquivo ausente não deveria produzir alteração")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write("(3 4 +)\n")
+            os.replace(path + ".tmp", path)
+            change = incremental._watch_read(path, signature)
+            if change is None or change[1] != ["(3 4 +)"]:
+                raise AssertionError("Alteração após o salvamento por renomeação não detectada")
+
+    print(f"Arquivo: {lines} linhas, {edits} edições reproduzíveis (semente {seed}): conformidade ok")
+    print(f"incremental:          {incremental_time / edits * 1000:>8.2f} ms/edição "
+          f"({reevaluated / edits:.1f} linha(s) reavaliada(s) em média)")
+    print(f"reavaliação completa: {full_time / edits * 1000:>8.2f} ms/edição")
+
+
+class _Interrupted(BaseException):
+    """Interrupção simulada (como Ctrl+C), lançada pelo exportador no meio do arquivo."""
+
+
+class _InterruptingWriter(main.JSONLinesWriter):
+    """Exportador JSON Lines que simula uma interrupção ao chegar em `stop_line`."""
+    def __init__(self, path, stop_line=None, resume=False):
+        super().__init__(path, resume)
+        self.stop_line = stop_line
+
+    def write(self, file_name, line_no, result, error):
+        if self.stop_line is not None and line_no >= self.stop_line:
+            self.flush() # Registros além do checkpoint ficam no arquivo, como numa queda real
+            raise _Interrupted()
+        super().write(file_name, line_no, result, error)
+
+
+def bench_resume(lines=20000, checkpoint_every=1000, seed=28):
+    corpus = _make_corpus(lines, seed)
+    # Inteiro exato além do limite de dígitos de str() (perfil otimizado), propagado por
+    # RES através de todos os checkpoints
+    big_corpus = ["(10 5000 ^)"] + ["(2 3 +)" if i % 2 else "(1 RES)" for i in range(1, 3 * checkpoint_every)]
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "saida.jsonl")
+
+        def check(name, corpus, stops, profile='classico'):
+            path = os.path.join(tmp, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(corpus) + "\n")
+
+            def run(calc, writer, **kwargs):
+                start = time.perf_counter()
+                with writer:
+                    calc.process_file(path, writer=writer, **kwargs)
+                return time.perf_counter() - start
+
+            def read_output():
+                with open(output, 'rb') as f:
+                    return f.read()
+
+            clean = main.RPNCalculator(verbose=False, profile=profile)
+            clean_time = run(clean, _InterruptingWriter(output))
+            expected = read_output()
+            for stop_line in stops:
+                try:
+                    run(main.RPNCalculator(verbose=False, profile=profile), _InterruptingWriter(output, stop_line),
+                        checkpoint_every=checkpoint_every)
+                    raise AssertionError("O processamento deveria ter sido interrompido")
+                except _Interrupted:
+                    pass
+                state = main.RPNCalculator(verbose=False, profile=profile)._load_checkpoint(path + ".ckpt")
+                if state is None:
+                    raise AssertionError(f"Nenhum checkpoint gravado antes da linha {stop_line}")
+                # A execução retomada usa o mesmo arquivo de saída, como `--resume --output`
+                resumed = main.RPNCalculator(verbose=False, profile=profile)
+                with contextlib.redirect_stderr(io.StringIO()):
+                    resume_time = run(resumed, _InterruptingWriter(output, resume=True), resume=True)
+                if read_output() != expected:
+                    raise AssertionError(f"{name}: saída retomada (interrupção na linha {stop_line}) diverge da execução limpa")
+                # Comparação valor a valor: NaN igual a NaN, e sem repr(), que recusa inteiros grandes
+                if not (clean._same_state(resumed.results, clean.results)
+                        and clean._same_state(resumed._memory_state(), clean._memory_state())):
+                    raise AssertionError(f"{name}: RES/memória após a retomada (linha {stop_line}) divergem da execução limpa")
+                print(f"{name}: interrupção na linha {stop_line:>6}: retomada da linha {state[1] + 1:>6} em "
+                      f"{resume_time * 1000:>7.1f} ms  ok")
+            return clean_time
+
+        clean_time = check("corpus.txt", corpus,
+                           sorted({lines // 3 + 3, lines // 2 + 7, lines - checkpoint_every // 2}))
+        check("inteiros.txt", big_corpus, [checkpoint_every + checkpoint_every // 2], profile='otimizado')
+    print(f"Arquivo: {lines} linhas, checkpoint a cada {checkpoint_every}; execução limpa em "
+          f"{clean_time * 1000:.1f} ms: conformidade ok")
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description="Microbenchmarks da Calculadora RPN.")
+    parser.add_argument('suite', nargs='?', default='operadores', choices=['operadores', 'threads', 'perfis', 'observacao', 'retomada'],
+                        help="Conjunto de medições a executar.")
+    parser.add_argument('--repeticoes', type=int, default=200000,
+                        help="Chamadas por medição (padrão: 200000).")
+    parser.add_argument('--threads', default="1,2,4,8",
+                        help="Tamanhos do pool de threads, separados por vírgula (padrão: 1,2,4,8).")
+    parser.add_argument('--linhas', type=int, default=5000,
+                        help="Linhas do corpus gerado para as suítes perfis, observacao e retomada (padrão: 5000).")
+    parser.add_argument('--edicoes', type=int, default=300,
+                        help="Edições aplicadas na suíte observacao (padrão: 300).")
+    args = parser.parse_args()
+    if args.suite == 'operadores':
+        bench_operators(args.repeticoes)
+    elif args.suite == 'threads':
+        bench_threads(tuple(int(n) for n in args.threads.split(',')))
+    elif args.suite == 'perfis':
+        bench_profiles(args.linhas)
+    elif args.suite == 'observacao':
+        bench_watch(args.linhas, args.edicoes)
+    elif args.suite == 'retomada':
+        bench_resume(args.linhas)
+
+
+if __name__ == "__main__":
+    main_bench()
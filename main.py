@@ -10,6 +10,23 @@ import sys
 import struct
 import math
 import os
+import time
+import argparse
+import io
+import csv
+import json
+import hashlib
+import marshal
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+import operator
+import itertools
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
 
 # --- Classes para os Nós da Árvore de Sintaxe Abstrata (AST) ---
 class ASTNode:
@@ -44,18 +61,30 @@ class BinOpNode(ASTNode):
         self.operator = operator
         self.left = left
         self.right = right
+        self.kind = None # 'int', 'real' ou None (desconhecido), definido por _specialize
+        self.op_func = None # Operação especializada; None = `operate` genérico
 
 class MemAccessNode(ASTNode):
-    """Representa o comando (MEM) - acesso ao valor da memória."""
-    def __init__(self):
-        super().__init__("MEM_ACCESS")
+    """
+        Representa o comando (MEM) - acesso ao valor da memória -
+        ou (X MEM) - acesso à célula de memória nomeada X.
+    """
+    def __init__(self, name=None, slot=None):
+        super().__init__("MEM_ACCESS" if name is None else f"MEM_ACCESS {name}")
+        self.name = name
+        self.slot = slot # Índice da célula em memory_cells (None = memória sem nome)
 
 class MemStoreNode(ASTNode):
-    """Representa o comando (V MEM) - armazenamento de valor na memória."""
-    def __init__(self, value_node):
-        super().__init__("MEM_STORE")
+    """
+        Representa o comando (V MEM) - armazenamento de valor na memória -
+        ou (V X MEM) - armazenamento na célula de memória nomeada X.
+    """
+    def __init__(self, value_node, name=None, slot=None):
+        super().__init__("MEM_STORE" if name is None else f"MEM_STORE {name}")
         self.add_child(value_node)
         self.value_node = value_node
+        self.name = name
+        self.slot = slot # Índice da célula em memory_cells (None = memória sem nome)
 
 class ResAccessNode(ASTNode):
     """Representa o comando (N RES) - acesso a resultados anteriores."""
@@ -91,22 +120,602 @@ class ForNode(ASTNode):
         self.end_val_node = end_val_node
         self.step_val_node = step_val_node
         self.body_node = body_node # O corpo do loop (uma Expressao RPN)
+        # Slot da variável de laço (None quando o identificador é um número, sem ligação)
+        self.slot = var_id_node.slot if isinstance(var_id_node, LoopVarNode) else None
+
+class LoopVarNode(ASTNode):
+    """
+        Representa a variável de um laço PARA (na declaração e nos usos dentro do corpo).
+        O nome é resolvido na análise sintática para um slot fixo, de modo que a
+        avaliação acessa uma posição de lista em vez de procurar o nome.
+    """
+    def __init__(self, name, slot):
+        super().__init__(name)
+        self.name = name
+        self.slot = slot
+
+class ErrorNode(ASTNode):
+    """Marca, na AST parcial, um grupo descartado pela recuperação de erros (nunca é avaliado)."""
+    def __init__(self):
+        super().__init__("ERRO")
+
+class EvaluationLimitError(RuntimeError):
+    """Erro levantado quando a avaliação de uma linha excede o orçamento de passos ou o prazo."""
+    pass
+
+# Registro estruturado produzido pela API de fluxo (iter_results/evaluate_many)
+LineResult = namedtuple('LineResult', ['line_no', 'result', 'error'])
+
+# Erro léxico ou sintático encontrado (--check, --diagnostics); column começa em 1
+Diagnostic = namedtuple('Diagnostic', ['file', 'line', 'column', 'message'])
+
+# Semântica da linguagem aceita pelo motor (ver RPNCalculator.PROFILES)
+SemanticsProfile = namedtuple('SemanticsProfile', [
+    'name',
+    'negative_literals',  # '-' seguido de dígito é lido como parte do número
+    'int_range',          # (mín, máx) dos literais inteiros, que ficam int; None = todo literal é real
+    'lenient_numbers',    # Qualquer token aceito por float() é um NUMERO nos termos
+    'nested_control',     # SE/PARA são termos (aninháveis) e os ramos são Termos
+    'paren_number',       # (N) é um número entre parênteses
+    'identifiers',        # Variáveis de laço e células de memória nomeadas
+    'operations',         # Operador -> função; None = `operate` com especialização por tipo
+    'tokens_first',       # No modo verboso, imprime os tokens antes do parsing
+    'messages',           # Textos das mensagens de erro que diferem entre os perfis
+])
+
+class ErrorToken(str):
+    """
+        Caractere inválido lido com a recuperação de erros ativa: em vez de descartar a
+        linha, o analisador léxico o entrega como um token. Nenhuma regra da gramática o
+        aceita, então o parser o rejeita (registrando `message`) e se sincroniza depois dele.
+    """
+    def __new__(cls, char, message, column):
+        token = super().__new__(cls, char)
+        token.message = message # Mensagem do erro léxico, a mesma da análise sem recuperação
+        token.column = column   # Coluna no conteúdo da linha (sem a indentação), a partir de 1
+        return token
+
+class TokenCursor:
+    """
+        Analisador léxico sob demanda para uma linha: o parser puxa os tokens conforme
+        precisa, pelo índice (como em uma lista), e eles são produzidos em pequenos lotes.
+        Apenas uma janela curta é mantida (keep=False); depois do fim da linha, todo
+        índice retorna 'EOF'. Um erro léxico só é lançado quando o parser alcança o
+        caractere inválido, então uma linha malformada falha sem ser lida até o fim.
+    """
+    BATCH = 8 # Tokens lidos por vez
+    recover = False # Ver RecoveringTokenCursor
+
+    def __init__(self, text, keep=False, profile=None):
+        if profile is None:
+            profile = RPNCalculator.PROFILES['classico']
+        self.text = text
+        self.negative_literals = profile.negative_literals
+        self.char_message = profile.messages['char']
+        self.pos = 0
+        self.base = 0       # Índice do primeiro token da janela
+        self.window = []    # Tokens já lidos e ainda acessíveis
+        self.keep = keep    # Mantém todos os tokens (para imprimi-los no modo verboso)
+        self.errors = []    # ErrorToken produzidos (só com recover)
+
+    def __getitem__(self, index):
+        offset = index - self.base
+        if offset < len(self.window):
+            return self.window[offset]
+        return self._fill(index)
+
+    def _fill(self, index):
+        """Lê tokens até `index`, descartando (sem keep) os já consumidos pelo parser."""
+        window = self.window
+        if not self.keep and len(window) > self.BATCH:
+            # O parser só olha o token atual e o seguinte: os anteriores não voltam a ser lidos
+            drop = min(index - self.base - 1, len(window))
+            del window[:drop]
+            self.base += drop
+        while index >= self.base + len(window):
+            if not self._lex(self.BATCH):
+                return 'EOF'
+        return window[index - self.base]
+
+    def finish(self):
+        """Lê o restante da linha (validando-o) e retorna a lista de tokens mantidos."""
+        while self._lex(self.BATCH):
+            if not self.keep:
+                self.base += len(self.window)
+                self.window.clear()
+        return self.window
+
+    def _lex(self, count):
+        """
+            Tokeniza manualmente, sem usar regex, até `count` tokens a partir de `pos`,
+            acrescentando-os à janela. Retorna quantos foram lidos (0 no fim da linha).
+            Um caractere inválido encerra o lote e só gera erro quando é o próximo a ser lido.
+        """
+        expression = self.text
+        tokens = self.window
+        negative = self.negative_literals
+        i = self.pos
+        n = len(expression)
+        read = 0
+
+        while i < n and read < count:
+            char = expression[i]
+            if char.isspace():
+                i += 1
+                continue
+
+            # Operadores e Parênteses ('-' seguido de dígito é um número, se o perfil admite negativos)
+            if char in ['+', '-', '*', '|', '/', '%', '^', '(', ')'] and not (
+                    negative and char == '-' and i + 1 < n and expression[i+1].isdigit()):
+                tokens.append(char)
+                i += 1
+                read += 1
+                continue
+
+            # Números (inteiros e flutuantes, incluindo negativos)
+            # Prioriza o '-' como parte de um número negativo se seguido por um dígito
+            if char.isdigit() or (char == '-' and i + 1 < n and expression[i+1].isdigit()):
+                start = i
+                if char == '-':
+                    i += 1 # Consome o '-'
+
+                while i < n and expression[i].isdigit():
+                    i += 1
+
+                if i < n and expression[i] == '.':
+                    i += 1 # Consome o '.'
+                    while i < n and expression[i].isdigit():
+                        i += 1
+                tokens.append(expression[start:i])
+                read += 1
+                continue
+
+            # Palavras-chave (MEM, RES, SE, ENTAO, SENAO, PARA, DE, ATE, PASSO, etc.)
+            if char.isalpha():
+                start = i
+                while i < n and (expression[i].isalpha() or expression[i].isdigit()): # Palavras podem conter números se forem IDs complexos
+                    i += 1
+                tokens.append(expression[start:i].upper()) # Guarda em maiúsculas para fácil comparação
+                read += 1
+                continue
+
+            # Caractere inválido
+            if self.recover: # Vira um token de erro e a leitura continua
+                token = ErrorToken(char, self.char_message.format(char=char, pos=i), i + 1)
+                tokens.append(token)
+                self.errors.append(token)
+                i += 1
+                read += 1
+                continue
+            if read:
+                break # Entrega os tokens anteriores; o erro vem na próxima leitura
+            self.pos = i
+            raise ValueError(self.char_message.format(char=char, pos=i))
+        self.pos = i
+        return read
+
+class RecoveringTokenCursor(TokenCursor):
+    """
+        Cursor da recuperação de erros: cada caractere inválido vira um ErrorToken (guardado
+        também em `errors`) e a leitura continua. `read_error` é o primeiro ErrorToken
+        entregue ao parser, inclusive por lookahead: sem recuperação, o erro léxico seria
+        lançado nesse momento.
+    """
+    recover = True
+
+    def __init__(self, text, keep=False, profile=None):
+        super().__init__(text, keep, profile)
+        self.read_error = None
+
+    def __getitem__(self, index):
+        token = TokenCursor.__getitem__(self, index)
+        if self.read_error is None and isinstance(token, ErrorToken):
+            self.read_error = token
+        return token
+
+class WatchLine:
+    """Estado em cache de uma linha do arquivo no modo de observação (--watch)."""
+    def __init__(self, text):
+        self.text = text              # Conteúdo bruto da linha
+        self.ast = None               # AST da linha (None para linha vazia, comentário ou erro de sintaxe)
+        self.parse_error = None       # Mensagem de erro léxico/sintático, se houver
+        self.parsed_line_num = 0      # Número da linha quando foi analisada (a mensagem de erro o cita)
+        self.lookback = -1            # Maior N usado em (N RES) na linha (-1 = não usa RES)
+        self.reads_memory = False     # A linha lê (MEM) ou (X MEM)
+        self.writes_memory = False    # A linha grava com (V MEM) ou (V X MEM)
+        self.suffix_lookback = -1     # Maior lookback desta linha até o fim do arquivo
+        # Entradas e saídas observadas na última avaliação da linha
+        self.results_before = 0       # Tamanho de `results` antes da linha
+        self.memory_before = (0.0,)   # Estado da memória (ver `_memory_state`) antes da linha
+        self.memory_after = (0.0,)    # Estado da memória depois da linha
+        self.result = None
+        self.error = None
+
+    def is_blank(self):
+        """Linha vazia ou comentário: não participa da avaliação."""
+        return self.ast is None and self.parse_error is None
+
+# --- Exportadores de Resultados ---
+class ResultWriter:
+    """
+        Base para os exportadores de resultados. Os registros são acumulados e
+        gravados em blocos num arquivo com buffer grande, sem `print` por linha.
+    """
+    BUFFER_SIZE = 1 << 20   # 1 MiB
+    BATCH_SIZE = 4096       # Registros acumulados antes de cada escrita
+
+    def __init__(self, path, resume=False):
+        """
+            resume: reabre um arquivo existente sem truncá-lo (--resume). Os registros são
+            regravados desde o início até que `resume_at` descarte o que vem depois do
+            último checkpoint; o excedente é cortado no `close`.
+        """
+        # Quem abriu o arquivo o fecha; a saída padrão pode ser trocada antes do close
+        self._owns_stream = path != '-'
+        self._resumed = False
+        if path == '-': # Saída padrão, para compor com outros programas em pipelines
+            self.stream = sys.stdout.buffer
+        elif resume and os.path.isfile(path):
+            self.stream = open(path, 'r+b', buffering=self.BUFFER_SIZE)
+            self._resumed = True
+        else:
+            self.stream = open(path, 'wb', buffering=self.BUFFER_SIZE)
+        self._pending = []
+
+    def write(self, file_name, line_no, result, error):
+        """Registra o resultado (ou o erro) de uma linha."""
+        self._pending.append(self.encode(file_name, line_no, result, error))
+        if len(self._pending) >= self.BATCH_SIZE:
+            self.flush()
+
+    def encode(self, file_name, line_no, result, error):
+        """Converte um registro em bytes no formato do exportador."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Grava os registros pendentes."""
+        if self._pending:
+            self.stream.write(b''.join(self._pending))
+            self._pending = []
+
+    def sync(self):
+        """Grava os registros pendentes e esvazia o buffer do arquivo (modo de fluxo)."""
+        self.flush()
+        self.stream.flush()
+
+    def checkpoint(self):
+        """
+            Grava e sincroniza os registros pendentes (para um checkpoint) e retorna o
+            tamanho da saída até aqui, ou None se ela não pode ser reposicionada (saída
+            padrão, pipe).
+        """
+        self.sync()
+        if not self._owns_stream or not self.stream.seekable():
+            return None
+        os.fsync(self.stream.fileno())
+        return self.stream.tell()
+
+    def resume_at(self, offset):
+        """Continua a saída em `offset` (gravado por `checkpoint`), descartando o restante."""
+        self.flush()
+        self.stream.seek(offset)
+        self.stream.truncate()
+
+    def close(self):
+        self.flush()
+        if self._owns_stream:
+            if self._resumed:
+                self.stream.truncate() # Sobra da execução anterior além do que foi regravado
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class JSONLinesWriter(ResultWriter):
+    """
+        Um objeto JSON por linha: {"file", "line", "status", "result", "error"}.
+        JSON estrito: infinito e NaN saem com status "nonfinite" e o resultado
+        como texto ("inf", "-inf" ou "nan"). Inteiros além do limite de dígitos de
+        str() saem com status "bigint" e o resultado em hexadecimal ("0x...").
+    """
+    def encode(self, file_name, line_no, result, error):
+        status = "ok" if error is None else "error"
+        if isinstance(result, float) and not math.isfinite(result):
+            status, result = "nonfinite", str(result)
+        record = {"file": file_name, "line": line_no, "status": status, "result": result, "error": error}
+        try:
+            return (json.dumps(record, ensure_ascii=False, allow_nan=False) + "\n").encode('utf-8')
+        except ValueError:
+            if not isinstance(result, int):
+                raise
+            # A conversão para hexadecimal não tem limite de dígitos
+            record["status"], record["result"] = "bigint", hex(result)
+            return (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+
+class CSVResultWriter(ResultWriter):
+    """CSV com cabeçalho: file,line,status,result,error."""
+    def __init__(self, path, resume=False):
+        super().__init__(path, resume)
+        self._text = io.StringIO()
+        self._csv = csv.writer(self._text, lineterminator='\n')
+        self._csv.writerow(["file", "line", "status", "result", "error"])
+
+    def write(self, file_name, line_no, result, error):
+        try:
+            self._csv.writerow([file_name, line_no, "ok" if error is None else "error",
+                                "" if result is None else result, "" if error is None else error])
+        except ValueError:
+            if not isinstance(result, int):
+                raise
+            # Inteiro além do limite de dígitos de str(): em hexadecimal, como no JSON Lines
+            self._csv.writerow([file_name, line_no, "bigint", hex(result), ""])
+        if self._text.tell() >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._text.tell():
+            self.stream.write(self._text.getvalue().encode('utf-8'))
+            self._text.seek(0)
+            self._text.truncate()
+
+class BinaryResultWriter(ResultWriter):
+    """
+        Registros binários de tamanho fixo (little-endian), após um cabeçalho de 16 bytes
+        (magic 'RPNR', versão u16, tamanho do registro u16, formato do valor 'd' ou 'e'):
+        linha u64, status u8 (0 = ok, 1 = erro, 2 = sem valor) e o valor em float64.
+        Erros e linhas sem valor gravam NaN.
+    """
+    VALUE_FORMAT = 'd'
+    MAGIC = b'RPNR'
+    VERSION = 1
+    STATUS_OK, STATUS_ERROR, STATUS_NONE = 0, 1, 2
+
+    def __init__(self, path, resume=False):
+        super().__init__(path, resume)
+        self.record = struct.Struct('<QB' + self.VALUE_FORMAT)
+        self.stream.write(struct.pack('<4sHHc7x', self.MAGIC, self.VERSION, self.record.size,
+                                      self.VALUE_FORMAT.encode('ascii')))
+
+    def encode(self, file_name, line_no, result, error):
+        if error is not None:
+            return self.record.pack(line_no, self.STATUS_ERROR, math.nan)
+        if result is None:
+            return self.record.pack(line_no, self.STATUS_NONE, math.nan)
+        try:
+            return self.record.pack(line_no, self.STATUS_OK, result)
+        except (OverflowError, struct.error): # struct.error: inteiro grande demais para float
+            # Fora da faixa do formato (ou inteiro grande demais para float): satura em infinito
+            return self.record.pack(line_no, self.STATUS_OK, math.inf if result > 0 else -math.inf)
+
+class HalfBinaryResultWriter(BinaryResultWriter):
+    """Igual a BinaryResultWriter, com o valor em half-precision (16 bits) IEEE 754."""
+    VALUE_FORMAT = 'e'
+
+# Formatos disponíveis para --format; novos exportadores podem ser registrados aqui
+RESULT_WRITERS = {
+    'jsonl': JSONLinesWriter,
+    'csv': CSVResultWriter,
+    'bin': BinaryResultWriter,
+    'bin16': HalfBinaryResultWriter,
+}
+
+def _ast_label(node):
+    """Texto de um nó da AST: o nome da classe e, se houver, o valor."""
+    name = node.__class__.__name__
+    return name if node.value is None else f"{name} (Value: {node.value})"
+
+class ASTWriter(ResultWriter):
+    """
+        Base para os exportadores de AST: cada AST é codificada em uma única passada
+        iterativa, direto no buffer, e pode ser truncada pela profundidade máxima
+        (max_depth, a partir da raiz) e pelo número máximo de nós (max_nodes).
+    """
+    def __init__(self, path, max_depth=None, max_nodes=None):
+        super().__init__(path)
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+
+    def write(self, file_name, line_no, ast):
+        """Registra a AST de uma linha."""
+        self._pending.append(self.encode(file_name, line_no, ast))
+        if len(self._pending) >= self.BATCH_SIZE:
+            self.flush()
+
+class JSONASTWriter(ASTWriter):
+    """
+        Um objeto JSON por linha: {"file", "line", "ast"}, com cada nó no formato
+        {"type", "value", "children"} (valores não finitos como texto). Filhos além da profundidade máxima são contados
+        em "omitted"; nós além do limite de nós viram {"truncated": true}.
+    """
+    def encode(self, file_name, line_no, ast):
+        parts = ['{"file": ', json.dumps(file_name, ensure_ascii=False), ', "line": ', str(line_no), ', "ast": ']
+        max_depth, max_nodes = self.max_depth, self.max_nodes
+        count = 0
+        stack = [(ast, 0)] # Nós a emitir (com a profundidade) ou trechos de texto já prontos
+        while stack:
+            item, depth = stack.pop()
+            if item is None:
+                parts.append('null')
+                continue
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            if max_nodes is not None and count >= max_nodes:
+                parts.append('{"truncated": true}')
+                continue
+            count += 1
+            value = item.value
+            if isinstance(value, float) and not math.isfinite(value):
+                value = str(value) # JSON estrito: literal fora da faixa do float vira "inf"
+            parts.append(f'{{"type": "{item.__class__.__name__}", "value": {json.dumps(value, ensure_ascii=False, allow_nan=False)}')
+            children = item.children
+            if children and max_depth is not None and depth >= max_depth:
+                parts.append(f', "children": [], "omitted": {len(children)}}}')
+                continue
+            parts.append(', "children": [')
+            stack.append((']}', depth))
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], depth + 1))
+                if i:
+                    stack.append((', ', depth))
+        parts.append('}\n')
+        return ''.join(parts).encode('utf-8')
+
+class DOTASTWriter(ASTWriter):
+    """
+        Um único grafo Graphviz DOT com um cluster por linha (rótulo arquivo:linha).
+        Subárvores truncadas aparecem como um nó '...'.
+    """
+    def __init__(self, path, max_depth=None, max_nodes=None):
+        super().__init__(path, max_depth, max_nodes)
+        self._next_id = 0
+        self._pending.append(b'digraph AST {\n  node [shape=box, fontname="monospace"];\n')
+
+    @staticmethod
+    def _quote(text):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    def encode(self, file_name, line_no, ast):
+        parts = [f'  subgraph cluster_{self._next_id} {{\n    label={self._quote(f"{file_name}:{line_no}")};\n']
+        max_depth, max_nodes = self.max_depth, self.max_nodes
+        next_id = self._next_id
+        count = 0
+        stack = [(ast, 0, None)] # (nó, profundidade, id do pai)
+        while stack:
+            node, depth, parent = stack.pop()
+            node_id = f"n{next_id}"
+            next_id += 1
+            children = ()
+            if node is None:
+                label = "None"
+            elif max_nodes is not None and count >= max_nodes:
+                label = "..."
+            else:
+                count += 1
+                label = _ast_label(node)
+                children = node.children
+            parts.append(f'    {node_id} [label={self._quote(label)}];\n')
+            if parent is not None:
+                parts.append(f'    {parent} -> {node_id};\n')
+            if not children:
+                continue
+            if max_depth is not None and depth >= max_depth:
+                parts.append(f'    n{next_id} [label="... ({len(children)})", shape=plaintext];\n')
+                parts.append(f'    {node_id} -> n{next_id};\n')
+                next_id += 1
+                continue
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], depth + 1, node_id))
+        parts.append('  }\n')
+        self._next_id = next_id
+        return ''.join(parts).encode('utf-8')
+
+    def close(self):
+        self._pending.append(b'}\n')
+        super().close()
+
+# Formatos disponíveis para --ast-format
+AST_WRITERS = {
+    'json': JSONASTWriter,
+    'dot': DOTASTWriter,
+}
 
 class RPNCalculator:
     """
         Implementa uma calculadora para RPN com analisador léxico, sintático (LL(1) + AST)
         e avaliador para RPN, incluindo comandos especiais e estruturas de controle.
     """
-    def __init__(self):
-        """Inicializa a calculadora."""
+    # Código compilado por arquivo, indexado pelo hash SHA-256 do conteúdo (compartilhado)
+    _compiled_cache = {}
+    _compiled_cache_lock = threading.Lock()
+    COMPILED_CACHE_SIZE = 128
+    # Versão do código gerado: faz parte da chave, invalidando caches em disco antigos
+    COMPILED_FORMAT = 3
+
+    def __init__(self, max_steps=None, time_limit=None, check_interval=1024, verbose=True,
+                 compiled=False, compile_cache_dir=None, memo_size=0, ast_max_depth=None,
+                 ast_max_nodes=None, ast_writer=None, profile='classico'):
+        """
+            Inicializa a calculadora.
+            max_steps: número máximo de nós avaliados por linha (None = sem limite).
+            time_limit: prazo em segundos para avaliar uma linha (None = sem limite).
+            check_interval: a cada quantos nós avaliados o orçamento é verificado.
+            verbose: se False, process_file não imprime tokens, AST nem resultados.
+            compiled: se True, arquivos avaliados sem impressão são compilados para
+            uma única função Python (ver `compile_file`).
+            compile_cache_dir: diretório onde os objetos de código compilados são
+            persistidos (marshal), reaproveitando a compilação entre execuções.
+            memo_size: número máximo de resultados de linhas puras memorizados entre
+            arquivos (0 = sem memorização; ver `_memo_evaluate`).
+            ast_max_depth, ast_max_nodes: truncam as ASTs impressas no modo verboso.
+            ast_writer: ASTWriter que recebe a AST de cada linha analisada; linhas
+            respondidas pelo memo ou pelo backend compilado não são analisadas.
+            profile: perfil de semântica, 'classico' (main.py) ou 'otimizado'
+            (main_optimized.py); ver PROFILES.
+        """
+        self.profile = self.PROFILES[profile]
+        # Atalhos para as opções do perfil consultadas a cada termo analisado
+        self._lenient_numbers = self.profile.lenient_numbers
+        self._nested_control = self.profile.nested_control
+        self._identifiers = self.profile.identifiers
         self.results = []
         self.memory = 0.0
+        self.memory_names = {}  # Nome da célula de memória -> slot (atribuído no parsing, por arquivo)
+        self.memory_cells = []  # Valores das células de memória nomeadas, indexados pelo slot
         self.current_file = ""
         self.current_line_num = 0
         self.current_line_content = ""
-        self.tokens = []        # Lista de tokens da expressão atual
+        self.tokens = []        # Tokens da expressão atual (lista ou TokenCursor)
         self.token_index = 0    # Índice do token atual no processo de parsing
+        self.token_end = 0      # Fim (exclusivo) dos tokens da linha atual em `tokens`
+        self._loop_var = None   # Variável de laço visível durante o parsing (nome ou None)
+        self.loop_slots = []    # Valores atuais das variáveis de laço, indexados pelo slot
         self.ast = None         # A AST gerada para a expressão atual
+        self.ast_max_depth = ast_max_depth
+        self.ast_max_nodes = ast_max_nodes
+        self.ast_writer = ast_writer
+        # Lista de Diagnostic: quando não é None, o parser se recupera dos erros léxicos e de
+        # sintaxe e registra todos os erros de cada linha (ver `_parse_group` e ErrorToken)
+        self.diagnostics = None
+        self._line_errors = []  # Erros da linha atual, na ordem em que foram encontrados
+        self._line_diagnostics = 0 # Índice em `diagnostics` do primeiro erro da linha atual
+        self._line_token_start = 0
+        self._line_indent = 0   # Espaços antes do conteúdo da linha (para as colunas)
+        self.verbose = verbose
+        self.compiled = compiled
+        self.compile_cache_dir = compile_cache_dir
+        # Estado do gerador de código (backend compilado)
+        self._compile_temps = 0
+        self._compile_available = []  # Variáveis locais dos resultados já produzidos, em ordem
+        self.last_error = None  # Mensagem do último erro reportado por evaluate_expression
+        # Orçamento de avaliação (protege contra laços PARA gigantes ou aninhados)
+        self.max_steps = max_steps
+        self.time_limit = time_limit
+        self.check_interval = max(1, check_interval)
+        self._steps = 0
+        self._next_check = sys.maxsize
+        self._deadline = None
+        # Estado do modo de observação (--watch)
+        self._watch_lines = []
+        self._watch_results = []
+        self._watch_memory = (0.0,)
+        # Estado do checkpoint do arquivo em processamento
+        self._checkpoint_log = None
+        self._checkpoint_logged = 0
+        # Memorização de linhas puras: forma canônica (tokens) -> resultado, em ordem LRU
+        self.memo_size = memo_size
+        self.memo = OrderedDict() if memo_size else None
+        self.memo_lock = threading.Lock()
+        self.shared_memo = None # Dicionário compartilhado entre processos (--jobs), só para laços
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.memo_shared_hits = 0
+        self.lines_evaluated = 0
 
     # --- Funções de Conversão (Mantidas para referência, mas não usadas na avaliação) ---
     def convertFloatToHalf(self, f):
@@ -153,50 +762,97 @@ class RPNCalculator:
             Tokeniza a expressão manualmente, sem usar regex.
             Retorna uma lista de strings.
         """
+        return TokenCursor(expression, keep=True, profile=self.profile).finish()
+
+    def _tokenize_buffer(self, text, error_columns=None):
+        """
+            Tokeniza um buffer com muitas linhas em uma única passada, sem criar
+            uma lista de tokens por linha. Retorna (tokens, line_starts, line_offsets, errors):
+            tokens: lista plana com os tokens de todas as linhas;
+            line_starts: índice em `tokens` do primeiro token de cada linha (+ sentinela final);
+            line_offsets: posição em `text` do início de cada linha (+ sentinela final);
+            errors: {índice da linha: mensagem} das linhas com caractere inválido.
+            error_columns: se fornecido, recebe {índice da linha: coluna do caractere inválido}
+            e ativa a recuperação: cada caractere inválido vira um ErrorToken e a linha
+            é tokenizada até o fim (errors e error_columns guardam o primeiro da linha).
+            Comentários ('#' no início da linha) não geram tokens.
+        """
         tokens = []
+        line_starts = [0]
+        line_offsets = [0]
+        errors = {}
+        content_start = -1 # Posição do primeiro caractere não branco da linha atual
+        negative = self.profile.negative_literals
         i = 0
-        n = len(expression)
-        
+        n = len(text)
+
         while i < n:
-            char = expression[i]
+            char = text[i]
+            if char == '\n':
+                i += 1
+                line_starts.append(len(tokens))
+                line_offsets.append(i)
+                content_start = -1
+                continue
             if char.isspace():
                 i += 1
                 continue
-            
-            # Operadores e Parênteses
-            if char in ['+', '-', '*', '|', '/', '%', '^', '(', ')']:
+
+            if content_start < 0:
+                content_start = i
+                if char == '#': # Comentário: ignora até o fim da linha
+                    i = text.find('\n', i)
+                    if i < 0:
+                        i = n
+                    continue
+
+            # Operadores e Parênteses (mesma prioridade do tokenizador por linha)
+            if char in '+-*|/%^()' and not (negative and char == '-' and i + 1 < n and text[i+1].isdigit()):
                 tokens.append(char)
                 i += 1
                 continue
 
-            # Números (inteiros e flutuantes, incluindo negativos)
-            # Prioriza o '-' como parte de um número negativo se seguido por um dígito
-            if char.isdigit() or (char == '-' and i + 1 < n and expression[i+1].isdigit()):
+            # Números (inteiros e flutuantes); um '-' só chega aqui como sinal de número negativo
+            if char.isdigit() or char == '-':
                 start = i
-                if char == '-':
-                    i += 1 # Consome o '-'
-                
-                while i < n and expression[i].isdigit():
+                i += 1
+                while i < n and text[i].isdigit():
                     i += 1
-                
-                if i < n and expression[i] == '.':
+                if i < n and text[i] == '.':
                     i += 1 # Consome o '.'
-                    while i < n and expression[i].isdigit():
+                    while i < n and text[i].isdigit():
                         i += 1
-                tokens.append(expression[start:i])
+                tokens.append(text[start:i])
                 continue
-            
-            # Palavras-chave (MEM, RES, SE, ENTAO, SENAO, PARA, DE, ATE, PASSO, etc.)
+
+            # Palavras-chave
             if char.isalpha():
                 start = i
-                while i < n and (expression[i].isalpha() or expression[i].isdigit()): # Palavras podem conter números se forem IDs complexos
+                while i < n and (text[i].isalpha() or text[i].isdigit()):
                     i += 1
-                tokens.append(expression[start:i].upper()) # Guarda em maiúsculas para fácil comparação
+                tokens.append(text[start:i].upper())
                 continue
-            
-            # Caractere inválido
-            raise ValueError(f"Caractere inesperado encontrado: '{char}' na posição {i}")
-        return tokens
+
+            # Caractere inválido: a linha inteira é descartada, com a mesma mensagem do tokenizador por linha
+            line_index = len(line_starts) - 1
+            message = self.profile.messages['char'].format(char=char, pos=i - content_start)
+            if error_columns is not None: # Recuperação: o caractere vira um token de erro
+                if line_index not in errors:
+                    errors[line_index] = message
+                    error_columns[line_index] = i - line_offsets[-1] + 1
+                tokens.append(ErrorToken(char, message, i - content_start + 1))
+                i += 1
+                continue
+            errors[line_index] = message
+            del tokens[line_starts[-1]:]
+            i = text.find('\n', i)
+            if i < 0:
+                i = n
+
+        if line_offsets[-1] < n: # Última linha sem '\n'
+            line_starts.append(len(tokens))
+            line_offsets.append(n)
+        return tokens, line_starts, line_offsets, errors
 
     # --- Operações Matemáticas (Permanece o mesmo) ---
     def operate(self, a, b, operator):
@@ -224,15 +880,215 @@ class RPNCalculator:
         else:
             raise ValueError(f"Operador inválido '{operator}'")
 
+    # --- Operações Especializadas por Tipo ---
+    # Usadas quando a inferência de tipos prova que os operandos são inteiros, dispensando
+    # as verificações `a == int(a)`. As mensagens de erro são as mesmas de `operate`.
+    @staticmethod
+    def _real_div(a, b):
+        if b == 0: raise ZeroDivisionError("Divisão real por zero.")
+        return a / b
+
+    @staticmethod
+    def _int_div(a, b):
+        if b == 0: raise ZeroDivisionError("Divisão inteira por zero.")
+        return int(a) // int(b)
+
+    @staticmethod
+    def _int_mod(a, b):
+        if b == 0: raise ZeroDivisionError("Módulo por zero.")
+        return int(a) % int(b)
+
+    @staticmethod
+    def _int_pow(a, b):
+        """
+            Potência exata: int ** int (exponenciação por quadrados) arredondada uma única
+            vez para real. Recorre a math.pow quando a base não é finita, é zero (preserva
+            o sinal de -0.0) ou o resultado excede a faixa dos reais.
+        """
+        n = int(b)
+        if n < 0: raise TypeError("Exponent must be a non-negative integer.")
+        try:
+            base = int(a)
+        except (OverflowError, ValueError): # inf ou nan
+            return math.pow(a, n)
+        # |base| ** n >= 2 ** (n * (bits - 1)): a partir de 2 ** 1024 o estouro é certo e a
+        # potência exata (enorme) nem é calculada
+        if base == 0 or n * (abs(base).bit_length() - 1) >= 1024:
+            return math.pow(a, n) # Estoura (OverflowError) como a versão genérica
+        try:
+            return float(base ** n)
+        except OverflowError: # Entre o limite acima e a faixa dos reais
+            return math.pow(a, n)
+
+    # Operador -> (operação para operandos inteiros, operação para os demais casos)
+    SPECIALIZED_OPERATIONS = {
+        '+': (operator.add, operator.add),
+        '-': (operator.sub, operator.sub),
+        '*': (operator.mul, operator.mul),
+        '|': (_real_div.__func__, _real_div.__func__),
+        '/': (_int_div.__func__, None),
+        '%': (_int_mod.__func__, None),
+        '^': (_int_pow.__func__, None),
+    }
+
+    # --- Operações do Perfil Otimizado ---
+    # Semântica de main_optimized.py: os inteiros continuam int ('/' é a divisão piso
+    # e '^' a potência exata do Python) e os reais seguem as regras do Python.
+    @staticmethod
+    def _opt_real_div(x, y):
+        if y != 0: return float(x) / y
+        raise ZeroDivisionError("Divisão real por zero.")
+
+    @staticmethod
+    def _opt_floor_div(x, y):
+        if y != 0: return x // y
+        raise ZeroDivisionError("Divisão inteira por zero.")
+
+    @staticmethod
+    def _opt_mod(x, y):
+        if y != 0: return x % y
+        raise ZeroDivisionError("Divisão módulo por zero.")
+
+    @staticmethod
+    def _opt_pow(x, y):
+        if y >= 0: return x ** y
+        raise TypeError("Expoente deve ser um inteiro não-negativo.")
+
+    # Perfis de semântica. O analisador léxico, o parser, o avaliador, o backend compilado
+    # e os demais caminhos rápidos são os mesmos: só as opções abaixo mudam.
+    PROFILES = {
+        'classico': SemanticsProfile(
+            name='classico', negative_literals=False, int_range=None, lenient_numbers=False,
+            nested_control=False, paren_number=False, identifiers=True, operations=None,
+            tokens_first=False,
+            messages={
+                'char': "Caractere inesperado encontrado: '{char}' na posição {pos}",
+                'line': "Erro de sintaxe na linha {line}: ",
+                'operator': "Erro de sintaxe: Esperado operador aritmético, encontrado '{token}'",
+                'res_negative': "N para RES deve ser não-negativo.",
+                'res_missing': "Não há {count} resultados anteriores para RES.",
+            }),
+        'otimizado': SemanticsProfile(
+            name='otimizado', negative_literals=True, int_range=(-32768, 32767), lenient_numbers=True,
+            nested_control=True, paren_number=True, identifiers=False,
+            operations={
+                '+': operator.add,
+                '-': operator.sub,
+                '*': operator.mul,
+                '|': _opt_real_div.__func__,
+                '/': _opt_floor_div.__func__,
+                '%': _opt_mod.__func__,
+                '^': _opt_pow.__func__,
+            },
+            tokens_first=True,
+            messages={
+                'char': "Caractere inesperado: '{char}' na posição {pos}",
+                'line': "Erro na linha {line}: ",
+                'operator': "Esperado operador aritmético, encontrado '{token}'",
+                'res_negative': "Índice para RES deve ser não-negativo.",
+                'res_missing': "Não há {count} resultados anteriores.",
+            }),
+    }
+
+    def _specialize(self, node):
+        """
+            Inferência de tipos: retorna o tipo do valor de `node` — 'int' (valor inteiro,
+            real ou int), 'real' ou None (desconhecido: MEM, RES, SE sem SENAO...) — e
+            escolhe para cada BinOpNode a operação especializada correspondente.
+        """
+        if isinstance(node, NumberNode):
+            return 'int' if node.value.is_integer() else 'real'
+        elif isinstance(node, LoopVarNode):
+            return 'int'
+        elif isinstance(node, BinOpNode):
+            left = self._specialize(node.left)
+            right = self._specialize(node.right)
+            op = node.operator
+            both_int = left == 'int' and right == 'int'
+            int_func, other_func = self.SPECIALIZED_OPERATIONS[op]
+            node.op_func = int_func if both_int else other_func
+            if op in ('/', '%'):
+                node.kind = 'int' # int(a) // int(b) ou falha
+            elif left is None or right is None:
+                node.kind = None
+            elif op == '|':
+                node.kind = 'real'
+            else:
+                node.kind = 'int' if both_int else 'real'
+            return node.kind
+        elif isinstance(node, MemStoreNode):
+            return self._specialize(node.value_node)
+        elif isinstance(node, IfNode):
+            self._specialize(node.condition)
+            then_kind = self._specialize(node.then_branch)
+            else_kind = self._specialize(node.else_branch) if node.else_branch else None
+            return then_kind if then_kind == else_kind else None
+        elif isinstance(node, ForNode):
+            body_kind = self._specialize(node.body_node)
+            step = node.step_val_node.value if node.step_val_node else 1
+            try: # Os limites são literais: um laço vazio (resultado None) é conhecido aqui
+                empty = not range(int(node.start_val_node.value), int(node.end_val_node.value) + 1, int(step))
+            except (ValueError, OverflowError):
+                return None
+            return None if empty else body_kind
+        return None # MEM e RES: o valor só é conhecido na avaliação
+
+    def _bind_operations(self, node):
+        """Liga cada BinOpNode da AST à operação da tabela do perfil (sem inferência de tipos)."""
+        operations = self.profile.operations
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, BinOpNode):
+                node.op_func = operations[node.operator]
+            stack.extend(node.children)
+
+    # Palavras reservadas: não podem ser usadas como nome de variável de laço
+    KEYWORDS = frozenset(['MEM', 'RES', 'SE', 'ENTAO', 'SENAO', 'PARA', 'DE', 'ATE', 'PASSO', 'EOF'])
+    # Slot da variável de laço. Há no máximo uma por linha: no perfil clássico PARA só
+    # aparece no nível superior, e o perfil otimizado (onde PARA aninha) não tem identificadores
+    LOOP_SLOT = 0
+
     # --- Métodos Auxiliares para o Parser LL(1) ---
+    def _is_identifier(self, token):
+        """Verifica se o token é um identificador (palavra que não é reservada), se o perfil os admite."""
+        return self._identifiers and token[:1].isalpha() and token not in self.KEYWORDS
+
+    def _is_signed_number(self, token):
+        """
+            Completa FIRST(<NUMERO>) para tokens que não são só dígitos: no perfil clássico,
+            '-' seguido de dígitos (dois tokens); com lenient_numbers, qualquer token aceito
+            por float() ('-5', '8.5'...).
+        """
+        if self._lenient_numbers:
+            try:
+                float(token)
+                return True
+            except ValueError:
+                return False
+        return token == '-' and self._peek(1).isdigit()
+
+    def _line_error(self, detail):
+        """SyntaxError com o prefixo de linha do perfil e a expressão atual."""
+        return SyntaxError(self.profile.messages['line'].format(line=self.current_line_num) +
+                           f"{detail} na expressão: '{self.current_line_content}'")
+
     def _get_current_token(self):
         """
             Retorna o token atual sem avançar.
         """
-        if self.token_index < len(self.tokens):
+        if self.token_index < self.token_end:
             return self.tokens[self.token_index]
         return 'EOF' # Marca o fim da entrada
 
+    def _peek(self, offset):
+        """
+            Retorna o token `offset` posições à frente do atual, sem avançar.
+            Não ultrapassa o fim da linha atual (retorna 'EOF').
+        """
+        index = self.token_index + offset
+        return self.tokens[index] if index < self.token_end else 'EOF'
+
     def _advance_token(self):
         """
             Avança para o próximo token.
@@ -248,27 +1104,160 @@ class RPNCalculator:
             self._advance_token()
             return current_token
         else:
-            raise SyntaxError(f"Erro de sintaxe na linha {self.current_line_num}: "
-                              f"Esperado '{expected_token_value}', encontrado '{current_token}' "
-                              f"na expressão: '{self.current_line_content}'")
+            raise self._line_error(f"Esperado '{expected_token_value}', encontrado '{current_token}'")
 
     # --- Analisador Sintático LL(1) (Descida Recursiva) e Construtor da AST ---
     def parse_line_to_ast(self):
+        """
+            Analisa a linha atual e especializa os operadores da AST pelos tipos inferidos
+            (ou, em perfis com tabela própria, liga cada operador à função da tabela).
+            Com um ast_writer, a AST também é exportada.
+        """
+        if self.diagnostics is None:
+            ast = self._parse_line()
+        else:
+            ast = self._parse_line_recovering()
+        if ast is not None:
+            if self.profile.operations is None:
+                self._specialize(ast)
+            else:
+                self._bind_operations(ast)
+            if self.ast_writer is not None:
+                self.ast_writer.write(self.current_file, self.current_line_num, ast)
+        return ast
+
+    def _parse_line_recovering(self, lexical=False):
+        """
+            Analisa a linha atual registrando em `diagnostics` todos os erros encontrados,
+            léxicos (ErrorToken) e sintáticos, em ordem de coluna. Se houver algum, a linha
+            continua inválida: o primeiro erro encontrado pelo parser é lançado, com a mesma
+            mensagem que a análise sem recuperação produziria.
+            lexical: a linha (em uma lista de tokens) tem algum ErrorToken.
+        """
+        self._line_token_start = self.token_index
+        self._line_errors = []
+        first = self._line_diagnostics = len(self.diagnostics)
+        ast = None
+        try:
+            ast = self._parse_line()
+        except SyntaxError as e: # Erro fora de qualquer grupo: não há onde se sincronizar
+            self._record_error(e)
+        # Caracteres inválidos não rejeitados pelo parser (descartados pela sincronização ou
+        # depois da declaração) também são erros da linha
+        if isinstance(self.tokens, TokenCursor):
+            self.tokens.finish()
+            lexical = self.tokens.errors
+        elif lexical or self._line_errors:
+            lexical = [token for token in self.tokens[self._line_token_start:self.token_end]
+                       if isinstance(token, ErrorToken)]
+        if lexical:
+            reported = {diagnostic.column for diagnostic in self.diagnostics[first:]}
+            for token in lexical:
+                if token.column + self._line_indent not in reported:
+                    self.diagnostics.append(Diagnostic(self.current_file, self.current_line_num,
+                                                       token.column + self._line_indent, token.message))
+            self.diagnostics[first:] = sorted(self.diagnostics[first:], key=lambda d: d.column)
+            if not self._line_errors: # Sem erro de sintaxe, a linha falha no primeiro caractere inválido
+                self._line_errors.append(ValueError(lexical[0].message))
+        if self._line_errors:
+            raise self._line_errors[0]
+        return ast
+
+    def _record_error(self, error, column=None):
+        """
+            Registra um erro da linha atual; sem `column`, usa a posição do token atual.
+            Se o parser rejeitou um ErrorToken, o erro registrado é o léxico.
+        """
+        token = self._get_current_token()
+        read_error = getattr(self.tokens, 'read_error', None)
+        if not self._line_errors and read_error is not None and read_error is not token:
+            # O parser viu um caractere inválido por lookahead antes deste erro: sem
+            # recuperação, o erro léxico teria sido lançado primeiro
+            self._line_errors.append(ValueError(read_error.message))
+            self.diagnostics.append(Diagnostic(self.current_file, self.current_line_num,
+                                               read_error.column + self._line_indent, read_error.message))
+        if isinstance(token, ErrorToken):
+            error, column = ValueError(token.message), token.column + self._line_indent
+        elif column is None:
+            count = min(self.token_index, self.token_end) - self._line_token_start
+            cursor = RecoveringTokenCursor(self.current_line_content, keep=True, profile=self.profile)
+            column = self._token_column(self.current_line_content,
+                                        [cursor[i] for i in range(count)]) + self._line_indent
+        if any(diagnostic.column == column for diagnostic in self.diagnostics[self._line_diagnostics:]):
+            return # Erro em cascata no mesmo ponto (ex.: vários ')' faltando no fim da linha)
+        self._line_errors.append(error)
+        self.diagnostics.append(Diagnostic(self.current_file, self.current_line_num, column, str(error)))
+
+    def _record_lexical_line(self, start, end, message, column):
+        """
+            Registra em `diagnostics` todos os erros de uma linha com caractere inválido,
+            cujos tokens vão de `start` a `end`. A linha não é avaliada: o erro dela é
+            sempre o léxico, como na análise sem recuperação.
+        """
+        self.token_index = start
+        self.token_end = end
+        try:
+            self._parse_line_recovering(lexical=True)
+        except Exception as e:
+            if e not in self._line_errors: # Ex.: RecursionError; registra ao menos o erro léxico
+                self.diagnostics.append(Diagnostic(self.current_file, self.current_line_num, column, message))
+
+    def _parse_group(self, parse):
+        """
+            Analisa com `parse` um grupo entre parênteses. Com a coleta de diagnósticos
+            ativa, um erro de sintaxe dentro do grupo (inclusive a rejeição de um
+            ErrorToken) é registrado e o parser entra em modo pânico (`_synchronize`):
+            o grupo vira um ErrorNode e a análise continua depois dele, encontrando os
+            demais erros da linha.
+        """
+        if self.diagnostics is None:
+            return parse()
+        try:
+            return parse()
+        except SyntaxError as e:
+            self._record_error(e)
+            self._synchronize()
+            return ErrorNode()
+
+    def _synchronize(self):
+        """
+            Descarta tokens até o ')' que fecha o grupo em que ocorreu o erro, ou até o fim
+            da linha. Os grupos internos já terminados foram consumidos inteiros, então só
+            o próprio grupo está aberto. O token seguinte ao ')' está em FOLLOW(<Expressao>)
+            = {')', $, '(', NUMERO} — um ponto seguro para o parser continuar.
+        """
+        depth = 1
+        while True:
+            token = self._get_current_token()
+            if token == 'EOF':
+                return
+            self._advance_token()
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _parse_line(self):
         """
             Ponto de entrada do parser para uma única linha (declaração/expressão).
             Assume que cada linha do arquivo é uma 'Declaracao' ou 'Expressao' de nível superior.
         """
+        # Variáveis de laço têm escopo de linha
+        self._loop_var = None
+
         # Decide qual regra gramatical seguir com base no lookahead
         current_token = self._get_current_token()
         
         # Lookahead para determinar se é um comando especial, uma expressão RPN, IF ou FOR
         if current_token == '(':
-            next_token = self.tokens[self.token_index + 1] if self.token_index + 1 < len(self.tokens) else None
+            next_token = self._peek(1)
             
             if next_token == 'SE': # if-then-else [cite: 29]
-                return self._parse_if_declaration()
+                return self._parse_group(self._parse_if_declaration)
             elif next_token == 'PARA': # for loop [cite: 29]
-                return self._parse_for_declaration()
+                return self._parse_group(self._parse_for_declaration)
             else: # Pode ser RPN comum ou (N RES), (V MEM), (MEM)
                 return self._parse_expression()
         elif current_token == 'EOF': # Linha vazia ou fim do arquivo
@@ -285,86 +1274,164 @@ class RPNCalculator:
         """
         current_token = self._get_current_token()
         if current_token == '(':
-            self._expect('(')
-            # Verifica o próximo token para determinar o tipo de expressão
-            first_inner_token = self.tokens[self.token_index] if self.token_index < len(self.tokens) else None
-            second_inner_token = self.tokens[self.token_index + 1] if self.token_index + 1 < len(self.tokens) else None
+            if self.diagnostics is None: # Sem recuperação, evita a chamada extra por grupo
+                return self._parse_parenthesized()
+            return self._parse_group(self._parse_parenthesized)
+        # Expressao ::= NUMERO
+        elif current_token.isdigit() or self._is_signed_number(current_token):
+            return self._parse_number()
+        elif self._is_identifier(current_token): # Expressao ::= ID (variável de laço)
+            return self._parse_loop_var()
+        else:
+            raise self._line_error(f"Esperado '(', ou NUMERO, encontrado '{current_token}'")
 
-            # Check for (MEM)
-            if first_inner_token == 'MEM':
-                self._expect('MEM')
-                self._expect(')')
-                return MemAccessNode()
-            
-            # Check for (RES)
-            try:
-                # Tenta consumir um número para V ou N
-                # NÃO AVANÇA TOKEN AINDA, apenas tenta converter para verificar tipo
-                _ = float(first_inner_token)
-                is_num_first_token = True
-            except ValueError:
-                is_num_first_token = False
+    def _parse_parenthesized(self):
+        """Expressao ::= '(' Termo Termo OP_ARITMETICA ')' | ComandoEspecial"""
+        self._expect('(')
+        # Verifica o próximo token para determinar o tipo de expressão
+        first_inner_token = self._peek(0)
+        second_inner_token = self._peek(1)
 
-            if is_num_first_token and (second_inner_token == 'MEM' or second_inner_token == 'RES'):
-                num_node = self._parse_number() # Consome e cria NumberNode para V ou N
-                keyword = self._get_current_token() # Pega MEM ou RES
-                self._advance_token() # Consome MEM ou RES
-                self._expect(')')
+        # Check for (MEM)
+        if first_inner_token == 'MEM':
+            self._expect('MEM')
+            self._expect(')')
+            return MemAccessNode()
 
-                if keyword == 'MEM':
-                    return MemStoreNode(num_node)
-                elif keyword == 'RES':
-                    return ResAccessNode(num_node)
-            else:
-                # É uma operação RPN binária: (Termo Termo OP_ARITMETICA)
-                left_term_node = self._parse_term()
-                right_term_node = self._parse_term()
-                operator = self._get_current_token()
-                
-                # Verifica se é um operador válido [cite: 13, 14, 15]
-                if operator not in ['+', '-', '*', '|', '/', '%', '^']:
-                     raise SyntaxError(f"Erro de sintaxe: Esperado operador aritmético, encontrado '{operator}'")
-                self._advance_token() # Consome operador
+        # Check for (X MEM) - célula de memória nomeada
+        if self._is_identifier(first_inner_token) and second_inner_token == 'MEM':
+            name = first_inner_token
+            if name == self._loop_var:
+                # Variável de laço visível: (i MEM) é (V MEM), grava o valor de i na memória
+                value_node = self._parse_loop_var()
+                self._expect('MEM')
                 self._expect(')')
-                return BinOpNode(operator, left_term_node, right_term_node)
+                return MemStoreNode(value_node)
+            self._advance_token()
+            self._expect('MEM')
+            self._expect(')')
+            return MemAccessNode(name, self._memory_slot(name))
         
-        # Expressao ::= NUMERO
-        elif current_token.isdigit() or (current_token == '-' and self.tokens[self.token_index + 1].isdigit()):
-            return self._parse_number()
+        # Check for (RES)
+        try:
+            # Tenta consumir um número para V ou N
+            # NÃO AVANÇA TOKEN AINDA, apenas tenta converter para verificar tipo
+            _ = float(first_inner_token)
+            is_num_first_token = True
+        except ValueError:
+            is_num_first_token = False
+
+        if is_num_first_token and (second_inner_token == 'MEM' or second_inner_token == 'RES'):
+            num_node = self._parse_number() # Consome e cria NumberNode para V ou N
+            keyword = self._get_current_token() # Pega MEM ou RES
+            self._advance_token() # Consome MEM ou RES
+            self._expect(')')
+
+            if keyword == 'MEM':
+                return MemStoreNode(num_node)
+            elif keyword == 'RES':
+                return ResAccessNode(num_node)
+        elif is_num_first_token and second_inner_token == ')' and self.profile.paren_number:
+            num_node = self._parse_number() # (N): número entre parênteses
+            self._expect(')')
+            return num_node
         else:
-            raise SyntaxError(f"Erro de sintaxe na linha {self.current_line_num}: "
-                              f"Esperado '(', ou NUMERO, encontrado '{current_token}' "
-                              f"na expressão: '{self.current_line_content}'")
+            # É uma operação RPN binária: (Termo Termo OP_ARITMETICA)
+            left_term_node = self._parse_term()
+
+            # Ou um armazenamento em célula nomeada: (Termo X MEM)
+            name = self._get_current_token()
+            if self._is_identifier(name) and self._peek(1) == 'MEM':
+                self._advance_token()
+                self._expect('MEM')
+                self._expect(')')
+                return MemStoreNode(left_term_node, name, self._memory_slot(name))
+
+            right_term_node = self._parse_term()
+            operator = self._get_current_token()
+            
+            # Verifica se é um operador válido [cite: 13, 14, 15]
+            if operator not in ['+', '-', '*', '|', '/', '%', '^']:
+                 raise SyntaxError(self.profile.messages['operator'].format(token=operator))
+            self._advance_token() # Consome operador
+            self._expect(')')
+            return BinOpNode(operator, left_term_node, right_term_node)
 
     # --- Análise Sintática para Termos ---
     def _parse_term(self):
         """
             Regra gramatical para Termo:
-            Termo ::= Expressao | NUMERO
+            Termo ::= Expressao | NUMERO | ID
         """
         current_token = self._get_current_token()
         if current_token == '(':
+            if self._nested_control and self._peek(1) in ('SE', 'PARA'):
+                return self._parse_control()
             return self._parse_expression()
-        elif current_token.isdigit() or (current_token == '-' and self.tokens[self.token_index + 1].isdigit()):
+        elif current_token.isdigit() or self._is_signed_number(current_token):
             return self._parse_number()
+        elif self._is_identifier(current_token):
+            return self._parse_loop_var()
         else:
-            raise SyntaxError(f"Erro de sintaxe na linha {self.current_line_num}: "
-                              f"Esperado '(', ou NUMERO, encontrado '{current_token}' "
-                              f"na expressão: '{self.current_line_content}'")
+            raise self._line_error(f"Esperado '(', ou NUMERO, encontrado '{current_token}'")
+
+    def _parse_control(self):
+        """Termo ::= IfDeclaracao | ForDeclaracao, nos perfis com nested_control."""
+        parse = self._parse_if_declaration if self._peek(1) == 'SE' else self._parse_for_declaration
+        if self.diagnostics is None:
+            return parse()
+        return self._parse_group(parse)
+
+    def _parse_branch(self):
+        """Condição e ramos de SE, corpo de PARA: Expressao, ou Termo com nested_control."""
+        if self._nested_control:
+            return self._parse_term()
+        return self._parse_expression()
 
     # --- Análise Sintática para Números ---
     def _parse_number(self):
         """Cria um nó de número a partir do token atual."""
         token_value = self._get_current_token()
+        if self.profile.int_range is not None:
+            return self._parse_ranged_number(token_value)
         try:
             value = float(token_value) # Números podem ser reais
             node = NumberNode(value)
             self._advance_token()
             return node
         except ValueError:
-            raise SyntaxError(f"Erro de sintaxe na linha {self.current_line_num}: "
-                              f"Esperado um número literal, encontrado '{token_value}' "
-                              f"na expressão: '{self.current_line_content}'")
+            raise self._line_error(f"Esperado um número literal, encontrado '{token_value}'")
+
+    def _parse_ranged_number(self, token_value):
+        """Literal com '.' é real; os demais são int e devem caber em `int_range` (16 bits)."""
+        try:
+            if '.' in token_value:
+                value = float(token_value)
+            else:
+                value = int(token_value)
+                low, high = self.profile.int_range
+                if not (low <= value <= high):
+                    raise SyntaxError(f"Número inteiro '{value}' fora do range de 16-bit ({low} a {high}).")
+        except ValueError:
+            raise SyntaxError(f"Esperado número válido, encontrado '{token_value}'")
+        self._advance_token()
+        return NumberNode(value)
+
+    def _memory_slot(self, name):
+        """Retorna o slot da célula de memória `name`, atribuindo o próximo livre no primeiro uso."""
+        slot = self.memory_names.get(name)
+        if slot is None:
+            slot = len(self.memory_names)
+            self.memory_names[name] = slot
+        return slot
+
+    def _parse_loop_var(self):
+        """Resolve o uso de uma variável de laço para o slot da declaração visível."""
+        name = self._get_current_token()
+        if name == self._loop_var:
+            self._advance_token()
+            return LoopVarNode(name, self.LOOP_SLOT)
+        raise self._line_error(f"Variável '{name}' não declarada em um laço PARA")
 
     # --- Análise Sintática para Declarações If e For ---
     def _parse_if_declaration(self):
@@ -374,14 +1441,14 @@ class RPNCalculator:
         """
         self._expect('(')
         self._expect('SE')
-        condition_node = self._parse_expression() # A condição é uma expressão RPN
+        condition_node = self._parse_branch() # A condição é uma expressão RPN
         self._expect('ENTAO')
-        then_branch_node = self._parse_expression() # O bloco 'then' é uma expressão RPN
+        then_branch_node = self._parse_branch() # O bloco 'then' é uma expressão RPN
 
         else_branch_node = None
         if self._get_current_token() == 'SENAO':
             self._expect('SENAO')
-            else_branch_node = self._parse_expression() # O bloco 'else' é uma expressão RPN
+            else_branch_node = self._parse_branch() # O bloco 'else' é uma expressão RPN
         
         self._expect(')')
         return IfNode(condition_node, then_branch_node, else_branch_node)
@@ -389,11 +1456,17 @@ class RPNCalculator:
     def _parse_for_declaration(self):
         """
             Regra gramatical para ForDeclaracao:
-            ForDeclaracao ::= '(' 'PARA' ID 'DE' NUMERO 'ATE' NUMERO ('PASSO' NUMERO)? Expressao ')'
+            ForDeclaracao ::= '(' 'PARA' (ID | NUMERO) 'DE' NUMERO 'ATE' NUMERO ('PASSO' NUMERO)? Expressao ')'
+            Com ID, a variável pode ser lida no corpo do laço; com NUMERO (forma antiga),
+            o identificador é apenas decorativo.
         """
         self._expect('(') # Verifica se o próximo token é '('
         self._expect('PARA') # Verifica se o próximo token é 'PARA'
-        var_id_node = self._parse_number() # Adapte se 'ID' for um nome literal (string)
+        if self._is_identifier(self._get_current_token()):
+            var_id_node = LoopVarNode(self._get_current_token(), self.LOOP_SLOT)
+            self._advance_token()
+        else:
+            var_id_node = self._parse_number()
         self._expect('DE') # Verifica se o próximo token é 'DE'
         start_val_node = self._parse_number() # O valor inicial do laço é um número
         self._expect('ATE') # Verifica se o próximo token é 'ATE'
@@ -404,32 +1477,77 @@ class RPNCalculator:
             self._expect('PASSO')
             step_val_node = self._parse_number()
         
-        body_node = self._parse_expression() # O corpo do laço é uma expressão RPN
+        if isinstance(var_id_node, LoopVarNode):
+            self._loop_var = var_id_node.name
+            body_node = self._parse_branch() # O corpo do laço é uma expressão RPN
+            self._loop_var = None
+        else:
+            body_node = self._parse_branch()
         self._expect(')')
         return ForNode(var_id_node, start_val_node, end_val_node, step_val_node, body_node)
 
+    # --- Orçamento de Avaliação ---
+    def _start_budget(self):
+        """Reinicia o contador de passos e o prazo para a avaliação de uma nova linha."""
+        self._steps = 0
+        self._deadline = time.monotonic() + self.time_limit if self.time_limit else None
+        if self.max_steps is None and self._deadline is None:
+            self._next_check = sys.maxsize # Sem limites: a verificação nunca dispara
+        else:
+            self._next_check = self.check_interval
+            if self.max_steps is not None:
+                self._next_check = min(self._next_check, self.max_steps + 1)
+
+    def _check_budget(self):
+        """
+            Verifica o orçamento de passos e o prazo. Chamada apenas a cada
+            `check_interval` nós avaliados, para manter o custo desprezível.
+        """
+        if self.max_steps is not None and self._steps > self.max_steps:
+            raise EvaluationLimitError(f"Orçamento de avaliação excedido: mais de {self.max_steps} passos.")
+        if self._deadline is not None and time.monotonic() > self._deadline:
+            raise EvaluationLimitError(f"Tempo limite de avaliação excedido ({self.time_limit} s).")
+        self._next_check = self._steps + self.check_interval
+        if self.max_steps is not None:
+            self._next_check = min(self._next_check, self.max_steps + 1)
+
     # --- Avaliação da AST ---
     def evaluate_ast(self, node):
         """
             Percorre a AST e avalia as expressões.
         """
+        self._steps += 1
+        if self._steps >= self._next_check:
+            self._check_budget()
+
         if isinstance(node, NumberNode):
             return node.value
         elif isinstance(node, BinOpNode):
             left_val = self.evaluate_ast(node.left)
             right_val = self.evaluate_ast(node.right)
+            if node.op_func is not None:
+                return node.op_func(left_val, right_val)
             return self.operate(left_val, right_val, node.operator)
         elif isinstance(node, MemAccessNode):
-            return self.memory 
+            if node.slot is None:
+                return self.memory 
+            cells = self.memory_cells
+            return cells[node.slot] if node.slot < len(cells) else 0.0 # Célula nunca gravada vale 0
         elif isinstance(node, MemStoreNode):
             value = self.evaluate_ast(node.value_node)
-            self.memory = value
+            if node.slot is None:
+                self.memory = value
+            else:
+                cells = self.memory_cells
+                if node.slot >= len(cells):
+                    cells.extend([0.0] * (node.slot + 1 - len(cells)))
+                cells[node.slot] = value
             return value
         elif isinstance(node, ResAccessNode):
             index = int(self.evaluate_ast(node.index_node)) # N é um inteiro não negativo [cite: 26]
-            if index < 0: raise ValueError("N para RES deve ser não-negativo.")
+            if index < 0: raise ValueError(self.profile.messages['res_negative'])
             if index >= len(self.results):
-                raise IndexError(f"Não há {index+1} resultados anteriores para RES.")
+                raise IndexError(self.profile.messages['res_missing'].format(count=index + 1))
             return self.results[-(index + 1)] # Acessa do final da lista de resultados
         elif isinstance(node, IfNode):
             condition_val = self.evaluate_ast(node.condition)
@@ -444,10 +1562,21 @@ class RPNCalculator:
             step = int(self.evaluate_ast(node.step_val_node)) if node.step_val_node else 1
             
             last_evaluated_result = None
+            slot = node.slot
+            if slot is None:
+                for i in range(start, end + 1, step):
+                    current_loop_result = self.evaluate_ast(node.body_node)
+                    last_evaluated_result = current_loop_result
+                return last_evaluated_result
+            slots = self.loop_slots
+            if slot >= len(slots):
+                slots.extend([0.0] * (slot + 1 - len(slots)))
             for i in range(start, end + 1, step):
-                current_loop_result = self.evaluate_ast(node.body_node)
-                last_evaluated_result = current_loop_result
+                slots[slot] = float(i) # Como os literais, a variável de laço é um número real
+                last_evaluated_result = self.evaluate_ast(node.body_node)
             return last_evaluated_result
+        elif isinstance(node, LoopVarNode):
+            return self.loop_slots[node.slot]
         elif isinstance(node, ProgramNode):
             # Um ProgramNode contém uma lista de declarações/expressões.
             # Avalia cada uma e armazena o resultado, retornando o último.
@@ -459,22 +1588,41 @@ class RPNCalculator:
             raise NotImplementedError(f"Avaliação não implementada para o tipo de nó: {type(node)}")
 
     # --- Impressão da AST (Representação Canônica) ---
-    def print_ast(self, node, level=0, prefix="Root: "):
-        """Imprime a Árvore de Sintaxe Abstrata de forma indentada."""
-        indent = "  " * level
-        if node is None:
-            print(f"{indent}{prefix}None")
-            return
-
-        node_info = f"{node.__class__.__name__}"
-        if node.value is not None:
-            node_info += f" (Value: {node.value})"
-        
-        print(f"{indent}{prefix}{node_info}")
+    def render_ast(self, node, level=0, prefix="Root: ", max_depth=None, max_nodes=None):
+        """
+            Monta a Árvore de Sintaxe Abstrata indentada em um único texto, percorrendo-a
+            iterativamente. max_depth (níveis abaixo da raiz) e max_nodes truncam árvores
+            grandes; None usa os limites da calculadora (ast_max_depth/ast_max_nodes).
+        """
+        if max_depth is None:
+            max_depth = self.ast_max_depth
+        if max_nodes is None:
+            max_nodes = self.ast_max_nodes
+        out = []
+        count = 0
+        stack = [(node, level, prefix)]
+        while stack:
+            node, depth, prefix = stack.pop()
+            indent = "  " * depth
+            if node is None:
+                out.append(f"{indent}{prefix}None")
+                continue
+            if max_nodes is not None and count >= max_nodes:
+                out.append(f"{indent}... (AST truncada: limite de {max_nodes} nós)")
+                break
+            count += 1
+            out.append(f"{indent}{prefix}{_ast_label(node)}")
+            children = node.children
+            if children and max_depth is not None and depth - level >= max_depth:
+                out.append(f"{indent}  ... ({len(children)} filho(s) omitido(s): profundidade máxima)")
+                continue
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], depth + 1, f"Child {i}: "))
+        return "\n".join(out)
 
-        for i, child in enumerate(node.children):
-            child_prefix = f"Child {i}: "
-            self.print_ast(child, level + 1, prefix=child_prefix)
+    def print_ast(self, node, level=0, prefix="Root: "):
+        """Imprime a Árvore de Sintaxe Abstrata de forma indentada, com uma única chamada a print."""
+        print(self.render_ast(node, level, prefix))
 
     # --- Processamento da Expressão (Ponto de Entrada Principal) ---
     def evaluate_expression(self, expression_string):
@@ -487,30 +1635,42 @@ class RPNCalculator:
             5. Armazena o resultado.
         """
         self.current_line_content = expression_string.strip()
+        self._line_indent = len(expression_string) - len(expression_string.lstrip())
+        self.last_error = None
         self.tokens = [] # Reinicia tokens para a linha atual
         self.token_index = 0 # Reinicia índice para a linha atual
 
         if not self.current_line_content or self.current_line_content.startswith('#'):
             return None # Ignora linhas vazias ou comentários
+        self.lines_evaluated += 1
         try:
             print(f"Expressão {self.current_line_num}: {self.current_line_content}")
             
-            # 1. Análise Léxica (Tokenização)
-            self.tokens = self._custom_tokenize(self.current_line_content)
-            # Adiciona EOF para o parser sinalizar o fim da entrada da linha
-            self.tokens.append('EOF') 
-            print(f"Tokens: {self.tokens}")
-
-            # 2. Análise Sintática (Construção da AST)
+            # 1. e 2. Análises Léxica e Sintática: o parser puxa os tokens do cursor sob
+            # demanda, então uma linha malformada falha sem ser tokenizada até o fim.
             # Para cada linha, chamamos o parser para construir a AST para aquela linha.
             # A gramática presume que cada linha é uma 'Declaracao' ou 'Expressao'.
+            cursor = TokenCursor if self.diagnostics is None else RecoveringTokenCursor
+            self.tokens = cursor(self.current_line_content, keep=True, profile=self.profile)
+            self.token_end = sys.maxsize # O fim da linha é sinalizado pelo cursor ('EOF')
+            if self.profile.tokens_first: # A linha inteira é tokenizada antes do parsing
+                tokens = self.tokens.finish()
+                if self.tokens.errors: # Só com diagnósticos: registra os erros da linha e falha no léxico
+                    error = self.tokens.errors[0]
+                    self._record_lexical_line(0, sys.maxsize, error.message, error.column + self._line_indent)
+                    raise ValueError(error.message)
+                print(f"Tokens: {tokens + ['EOF']}")
             current_line_ast = self.parse_line_to_ast()
+            if not self.profile.tokens_first:
+                # O restante da linha ainda precisa ser lexicamente válido
+                print(f"Tokens: {self.tokens.finish() + ['EOF']}")
 
             print("\n--- Árvore Sintática Abstrata (AST) ---")
             self.print_ast(current_line_ast)
             print("----------------------------------------")
 
-            # 3. Avaliação da AST
+            # 3. Avaliação da AST (sob o orçamento de passos/prazo configurado)
+            self._start_budget()
             result = self.evaluate_ast(current_line_ast)
             
             # Armazena o resultado para o comando (N RES)
@@ -519,9 +1679,774 @@ class RPNCalculator:
             return result
 
         except Exception as e:
-            self.generate_error_report(str(e))
+            self.last_error = str(e)
+            self.generate_error_report(self.last_error)
             return None
 
+    # --- Análise e Avaliação Silenciosas (sem impressão) ---
+    def _parse_source(self, source, indent=0, tokens=None):
+        """
+            Tokeniza e analisa o conteúdo (já sem espaços nas bordas) de uma linha, retornando a AST.
+            indent: espaços removidos do início da linha (só ajusta as colunas dos diagnósticos).
+            tokens: tokens de `source` já lidos (ex.: para a chave do memo); o parser os
+            percorre como lista, sem tokenizar a linha de novo.
+        """
+        self.current_line_content = source
+        self._line_indent = indent
+        if tokens is not None:
+            self.tokens = tokens
+            self.token_index = 0
+            self.token_end = len(tokens)
+            return self.parse_line_to_ast()
+        cursor = TokenCursor if self.diagnostics is None else RecoveringTokenCursor
+        self.tokens = cursor(source, profile=self.profile)
+        self.token_index = 0
+        self.token_end = sys.maxsize # O fim da linha é sinalizado pelo cursor ('EOF')
+        ast = self.parse_line_to_ast()
+        self.tokens.finish() # O restante da linha ainda precisa ser lexicamente válido
+        return ast
+
+    def _evaluate_line_ast(self, ast):
+        """Avalia a AST de uma linha sob o orçamento configurado e armazena o resultado para (N RES)."""
+        self._start_budget()
+        result = self.evaluate_ast(ast)
+        self.results.append(result)
+        return result
+
+    # --- API de Fluxo (uso como biblioteca, sem impressão) ---
+    def reset_scope(self):
+        """Reinicia o escopo de aplicação: limpa os resultados de (N RES), a memória e as células nomeadas."""
+        self.results = []
+        self.memory = 0.0
+        self.memory_names = {}
+        self.memory_cells = []
+
+    def iter_results(self, source, reset_scope=True):
+        """
+            Avalia linhas sem imprimir nada, gerando um LineResult(line_no, result, error)
+            por linha avaliada (linhas vazias e comentários são ignorados).
+            source: caminho de arquivo (str ou os.PathLike) ou iterável de linhas.
+            reset_scope: se False, continua no escopo atual (resultados e memória),
+            permitindo que o chamador decida onde cada escopo começa e termina.
+        """
+        if reset_scope:
+            self.reset_scope()
+        if isinstance(source, (str, os.PathLike)) and self.compiled and reset_scope:
+            # O código compilado sempre começa um escopo novo
+            self.current_file = os.path.basename(source)
+            yield from self._iter_compiled_results(source)
+        elif isinstance(source, (str, os.PathLike)):
+            self.current_file = os.path.basename(source)
+            line_num = 0
+            with self._open_input(source) as f:
+                for text, _ in self._iter_input_blocks(f, source):
+                    yield from self._iter_buffer_results(text, line_num + 1)
+                    line_num += self._count_lines(text)
+        else:
+            yield from self._iter_line_results(source)
+
+    def evaluate_many(self, source, reset_scope=True):
+        """Versão não preguiçosa de `iter_results`: retorna a lista de LineResult."""
+        return list(self.iter_results(source, reset_scope=reset_scope))
+
+    def _iter_line_results(self, lines):
+        """Avalia cada linha do iterável no escopo atual, gerando LineResult."""
+        for line_num, line in enumerate(lines, 1):
+            content = line.strip()
+            if not content or content.startswith('#'):
+                continue
+            yield self._line_result(line_num, content, line.find(content[0]))
+
+    def _line_result(self, line_num, content, indent=0):
+        """Avalia o conteúdo (não vazio) de uma linha no escopo atual, retornando um LineResult."""
+        self.current_line_num = line_num
+        self.lines_evaluated += 1
+        key = None
+        if self.memo is not None:
+            try:
+                tokens = self._custom_tokenize(content)
+            except ValueError:
+                pass # Erro léxico: reportado pelo caminho normal
+            else:
+                key = ' '.join(tokens)
+                result = self._memo_lookup(key)
+                if result is not self._MEMO_MISSING:
+                    return LineResult(line_num, result, None)
+        try:
+            if key is not None: # Falta no memo: analisa os mesmos tokens da chave
+                result = self._memo_evaluate(key, self._parse_source(content, indent, tokens))
+            else:
+                result = self._evaluate_line_ast(self._parse_source(content, indent))
+        except Exception as e:
+            return LineResult(line_num, None, str(e))
+        return LineResult(line_num, result, None)
+
+    # --- Memorização de Linhas Puras ---
+    # Uma linha é pura se não acessa MEM (com ou sem nome) nem RES: o resultado depende só
+    # da AST, que por sua vez depende só da sequência de tokens (a chave do memo).
+    _MEMO_MISSING = object()
+
+    def _is_pure(self, node):
+        if isinstance(node, (MemAccessNode, MemStoreNode, ResAccessNode)):
+            return False
+        return all(self._is_pure(child) for child in node.children)
+
+    def _memo_lookup(self, key):
+        """Consulta o memo; num acerto, registra o resultado para (N RES) como a avaliação faria."""
+        memo = self.memo
+        with self.memo_lock: # O memo pode ser compartilhado entre threads (RPNEngine)
+            result = memo.get(key, self._MEMO_MISSING)
+            if result is self._MEMO_MISSING:
+                return result
+            memo.move_to_end(key)
+        self.memo_hits += 1
+        self.results.append(result)
+        return result
+
+    def _memo_store(self, key, value):
+        memo = self.memo
+        with self.memo_lock:
+            memo[key] = value
+            if len(memo) > self.memo_size:
+                memo.popitem(last=False) # Descarta a entrada usada há mais tempo
+
+    def _memo_evaluate(self, key, ast):
+        """
+            Avalia a AST de uma linha e memoriza o resultado se ela for pura. Com um memo
+            compartilhado (--jobs), linhas puras com laço PARA são procuradas nele antes da
+            avaliação: só elas custam mais que a comunicação entre processos.
+        """
+        if not self._is_pure(ast):
+            return self._evaluate_line_ast(ast) # Fora do LRU: não desaloja entradas puras
+        shared = self.shared_memo if self.shared_memo is not None and self._has_loop(ast) else None
+        if shared is not None:
+            try:
+                result = shared[key] # Um proxy do Manager devolve cópias: sem sentinela
+            except KeyError:
+                pass
+            else:
+                self.memo_shared_hits += 1
+                self.memo_hits += 1
+                self._memo_store(key, result)
+                self.results.append(result)
+                return result
+        self.memo_misses += 1
+        result = self._evaluate_line_ast(ast)
+        self._memo_store(key, result)
+        if shared is not None:
+            shared[key] = result
+        return result
+
+    def memo_stats(self):
+        """Contadores da memorização: (linhas avaliadas, acertos, faltas, acertos no memo compartilhado)."""
+        return (self.lines_evaluated, self.memo_hits, self.memo_misses, self.memo_shared_hits)
+
+    def _iter_buffer_results(self, text, first_line_num):
+        """
+            Avalia um bloco de linhas com um único passo de tokenização (`_tokenize_buffer`).
+            O parser percorre a lista plana de tokens usando o índice de início de cada linha.
+        """
+        error_columns = {} if self.diagnostics is not None else None
+        tokens, line_starts, line_offsets, errors = self._tokenize_buffer(text, error_columns)
+        self.tokens = tokens
+        for k in range(len(line_starts) - 1):
+            start, end = line_starts[k], line_starts[k + 1]
+            error = errors.get(k)
+            if start == end and error is None:
+                continue # Linha vazia ou comentário
+            line_num = first_line_num + k
+            self.current_line_num = line_num
+            line = text[line_offsets[k]:line_offsets[k + 1]]
+            self.current_line_content = line.strip()
+            if error_columns is not None:
+                self._line_indent = len(line) - len(line.lstrip())
+            if error is not None:
+                if error_columns is not None:
+                    self._record_lexical_line(start, end, error, error_columns[k])
+                yield LineResult(line_num, None, error)
+                continue
+            self.token_index = start
+            self.token_end = end
+            self.lines_evaluated += 1
+            if self.memo is not None:
+                key = ' '.join(tokens[start:end]) # Forma canônica: a AST depende só dos tokens
+                result = self._memo_lookup(key)
+                if result is not self._MEMO_MISSING:
+                    yield LineResult(line_num, result, None)
+                    continue
+            try:
+                if self.memo is not None:
+                    result = self._memo_evaluate(key, self.parse_line_to_ast())
+                else:
+                    result = self._evaluate_line_ast(self.parse_line_to_ast())
+            except Exception as e:
+                yield LineResult(line_num, None, str(e))
+                continue
+            yield LineResult(line_num, result, None)
+
+    # --- Backend Compilado (arquivo inteiro -> uma função Python) ---
+    @staticmethod
+    def _literal(value):
+        """Representa um número como literal Python (inf/nan não têm literal próprio)."""
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"float('{value}')"
+        return repr(value)
+
+    def _new_temp(self):
+        self._compile_temps += 1
+        return f"t{self._compile_temps}"
+
+    def _count_nodes(self, node):
+        """Número de nós de uma subárvore (passos que o interpretador contaria)."""
+        return 1 + sum(self._count_nodes(child) for child in node.children)
+
+    def _emit_node(self, node, out, indent):
+        """
+            Gera instruções Python para `node` em `out`, preservando a ordem de avaliação
+            do interpretador, e retorna a expressão (literal ou variável) com o seu valor.
+        """
+        pad = "    " * indent
+        if isinstance(node, NumberNode):
+            return self._literal(node.value)
+        elif isinstance(node, BinOpNode):
+            left = self._emit_node(node.left, out, indent)
+            right = self._emit_node(node.right, out, indent)
+            temp = self._new_temp()
+            if node.operator in ('+', '-', '*'):
+                out.append(f"{pad}{temp} = {left} {node.operator} {right}")
+            elif node.op_func is not None: # Operação especializada, global do código gerado
+                out.append(f"{pad}{temp} = {node.op_func.__name__}({left}, {right})")
+            else:
+                out.append(f"{pad}{temp} = _operate({left}, {right}, {node.operator!r})")
+            return temp
+        elif isinstance(node, LoopVarNode):
+            return f"_v{node.slot}"
+        elif isinstance(node, MemAccessNode):
+            temp = self._new_temp() # Cópia: uma gravação posterior na mesma linha não pode afetá-la
+            out.append(f"{pad}{temp} = {'mem' if node.slot is None else f'm{node.slot}'}")
+            return temp
+        elif isinstance(node, MemStoreNode):
+            value = self._emit_node(node.value_node, out, indent)
+            out.append(f"{pad}{'mem' if node.slot is None else f'm{node.slot}'} = {value}")
+            return value
+        elif isinstance(node, ResAccessNode):
+            index = int(node.index_node.value)
+            if index < 0:
+                out.append(f"{pad}raise ValueError({self.profile.messages['res_negative']!r})")
+                return "None"
+            if index >= len(self._compile_available):
+                out.append(f"{pad}raise IndexError({self.profile.messages['res_missing'].format(count=index + 1)!r})")
+                return "None"
+            # Referência direta ao resultado da linha; depois de uma linha com erro de
+            # execução os índices deslocam e a referência é resolvida em tempo de execução
+            return f"({self._compile_available[-(index + 1)]} if _ok else _res({index}))"
+        elif isinstance(node, IfNode):
+            condition = self._emit_node(node.condition, out, indent)
+            temp = self._new_temp()
+            out.append(f"{pad}if {condition} != 0:")
+            value = self._emit_node(node.then_branch, out, indent + 1)
+            out.append(f"{pad}    {temp} = {value}")
+            out.append(f"{pad}else:")
+            if node.else_branch:
+                value = self._emit_node(node.else_branch, out, indent + 1)
+                out.append(f"{pad}    {temp} = {value}")
+            else:
+                out.append(f"{pad}    {temp} = None")
+            return temp
+        elif isinstance(node, ForNode):
+            start = self._literal(node.start_val_node.value)
+            end = self._literal(node.end_val_node.value)
+            step = self._literal(node.step_val_node.value) if node.step_val_node else "1"
+            temp = self._new_temp()
+            out.append(f"{pad}{temp} = None")
+            if node.slot is None:
+                out.append(f"{pad}for _ in range(int({start}), int({end}) + 1, int({step})):")
+            else: # A variável de laço é a local _vN, com N o slot resolvido no parsing
+                out.append(f"{pad}for _v{node.slot} in map(float, range(int({start}), int({end}) + 1, int({step}))):")
+            # Orçamento: soma os passos do corpo e só chama _check a cada check_interval
+            out.append(f"{pad}    _n += {self._count_nodes(node.body_node)}")
+            out.append(f"{pad}    if _n >= _check_at: _check_at = _check(_n)")
+            value = self._emit_node(node.body_node, out, indent + 1)
+            out.append(f"{pad}    {temp} = {value}")
+            return temp
+        else:
+            raise NotImplementedError(f"Compilação não implementada para o tipo de nó: {type(node)}")
+
+    def _has_loop(self, node):
+        return isinstance(node, ForNode) or any(self._has_loop(child) for child in node.children)
+
+    def compile_source(self, text):
+        """
+            Traduz um arquivo inteiro para o código-fonte de um gerador Python, `_programa`,
+            em que o resultado de cada linha é uma variável local (rN para a linha N),
+            (N RES) é uma referência direta à variável da linha correspondente, a
+            memória é a variável local `mem` e a célula nomeada de slot N é a local `mN`.
+            O gerador produz (linha, resultado, erro) e retorna o estado final da
+            memória; a constante CELLS lista os nomes das células na ordem dos slots.
+        """
+        tokens, line_starts, line_offsets, errors = self._tokenize_buffer(text)
+        self.tokens = tokens
+        self._compile_temps = 0
+        self._compile_available = []
+        saved_names, self.memory_names = self.memory_names, {} # O arquivo é um escopo novo
+        # _ok: nenhuma linha falhou na execução, então (N RES) pode usar as locais rN
+        out = ["def _programa(_operate, _start, _check, _res):",
+               "    mem = 0.0",
+               "    _ok = True"]
+        for k in range(len(line_starts) - 1):
+            start, end = line_starts[k], line_starts[k + 1]
+            error = errors.get(k)
+            if start == end and error is None:
+                continue # Linha vazia ou comentário
+            line_num = k + 1
+            self.current_line_num = line_num
+            self.current_line_content = text[line_offsets[k]:line_offsets[k + 1]].strip()
+            if error is None:
+                self.token_index = start
+                self.token_end = end
+                try:
+                    ast = self.parse_line_to_ast()
+                except Exception as e:
+                    error = str(e)
+            if error is not None: # Erro léxico ou sintático: conhecido na compilação
+                out.append(f"    yield {line_num}, None, {error!r}")
+                continue
+            local = f"r{line_num}"
+            self._compile_temps = 0 # Temporários não sobrevivem à linha: reaproveita os nomes
+            # Um bloco try por linha (custo zero sem exceção): um erro afeta só a sua linha
+            out.append("    try:")
+            if self._has_loop(ast):
+                out.append("        _n = 0; _check_at = _start()")
+            value = self._emit_node(ast, out, 2)
+            out.append(f"        {local} = {value}")
+            out.append("    except Exception as _e:")
+            out.append("        _ok = False")
+            out.append(f"        yield {line_num}, None, str(_e)")
+            out.append("    else:")
+            out.append(f"        yield {line_num}, {local}, None")
+            self._compile_available.append(local)
+        cells = [f"m{slot}" for slot in range(len(self.memory_names))]
+        if cells:
+            out.insert(2, "    " + " = ".join(cells) + " = 0.0")
+        out.append(f"    return ({', '.join(['mem'] + cells)},)")
+        names = sorted(self.memory_names, key=self.memory_names.get)
+        out.append(f"CELLS = {tuple(names)!r}")
+        self.memory_names = saved_names
+        return "\n".join(out) + "\n"
+
+    def compile_file(self, filename):
+        """
+            Compila um arquivo com `compile_source` e `compile()` uma única vez,
+            guardando o objeto de código em cache pelo hash do conteúdo.
+            Retorna (código ou None se o arquivo não puder ser compilado, texto do arquivo).
+        """
+        with self._open_input(filename) as f:
+            data = f.read()
+        text = data.decode('utf-8')
+        # O perfil entra na chave: o mesmo texto gera código diferente em cada semântica
+        key = hashlib.sha256(b'%d:%s:' % (self.COMPILED_FORMAT, self.profile.name.encode()) + data).hexdigest()
+        cache = RPNCalculator._compiled_cache
+        code = cache.get(key, False)
+        if code is not False:
+            return code, text
+
+        # O formato do marshal depende da versão do Python: ela faz parte do nome do arquivo
+        cache_path = None
+        if self.compile_cache_dir:
+            cache_path = os.path.join(self.compile_cache_dir, f"{key}.{sys.implementation.cache_tag}.rpnc")
+        code = None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                code = marshal.load(f)
+        else:
+            try:
+                code = compile(self.compile_source(text), f"<rpn {os.path.basename(filename)}>", "exec")
+            except (SyntaxError, RecursionError, MemoryError):
+                code = None # Ex.: aninhamento além do limite do CPython; usa o interpretador
+            if code is not None and cache_path:
+                os.makedirs(self.compile_cache_dir, exist_ok=True)
+                # Nome temporário por thread: duas podem compilar o mesmo arquivo ao mesmo tempo
+                tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    marshal.dump(code, f)
+                os.replace(tmp_path, cache_path)
+        with RPNCalculator._compiled_cache_lock:
+            if len(cache) >= self.COMPILED_CACHE_SIZE:
+                cache.pop(next(iter(cache)), None) # Descarta a entrada mais antiga
+            cache[key] = code
+        return code, text
+
+    def _iter_compiled_results(self, filename):
+        """Avalia um arquivo pelo backend compilado, gerando LineResult."""
+        code, text = self.compile_file(filename)
+        if code is None:
+            yield from self._iter_buffer_results(text, 1)
+            return
+        namespace = {func.__name__: func for func in (self._real_div, self._int_div, self._int_mod, self._int_pow,
+                                                      self._opt_real_div, self._opt_floor_div, self._opt_mod,
+                                                      self._opt_pow)}
+        exec(code, namespace)
+        self.memory_names = {name: slot for slot, name in enumerate(namespace['CELLS'])}
+
+        def start():
+            self._start_budget()
+            return self._next_check
+
+        def check(steps):
+            self._steps = steps
+            self._check_budget()
+            return self._next_check
+
+        def res(index):
+            # (N RES) depois de uma linha com erro de execução: mesma regra do interpretador
+            if index >= len(results):
+                raise IndexError(self.profile.messages['res_missing'].format(count=index + 1))
+            return results[-(index + 1)]
+
+        results = self.results
+        program = namespace['_programa'](self.operate, start, check, res)
+        while True:
+            try:
+                line_num, result, error = next(program)
+            except StopIteration as stop:
+                self._restore_memory_state(stop.value)
+                return
+            self.current_line_num = line_num
+            self.lines_evaluated += 1 # Como em `_line_result`: toda linha que produz um registro
+            if error is None:
+                results.append(result)
+            yield LineResult(line_num, result, error)
+
+    # --- Leitura de Arquivos em Blocos ---
+    READ_BLOCK_SIZE = 1 << 22 # 4 MiB
+
+    def _read_blocks(self, f):
+        """
+            Lê um arquivo binário, a partir da posição atual, em blocos grandes de linhas
+            completas. Gera (texto do bloco, offset em bytes do fim do bloco).
+        """
+        offset = f.tell()
+        pending = b''
+        while True:
+            chunk = f.read(self.READ_BLOCK_SIZE)
+            if not chunk:
+                if pending: # Última linha sem '\n'
+                    yield pending.decode('utf-8'), offset + len(pending)
+                return
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                pending = data # Linha maior que o bloco: continua lendo
+                continue
+            offset += cut
+            yield data[:cut].decode('utf-8'), offset
+            pending = data[cut:]
+
+    # Extensão -> função que abre o arquivo compactado como fluxo binário descompactado
+    COMPRESSED_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+    INPUT_SUFFIXES = ('.txt', '.txt.gz', '.txt.bz2', '.txt.xz')
+    READ_QUEUE_DEPTH = 4 # Blocos descompactados à frente da avaliação
+
+    def _open_input(self, filename):
+        """Abre um arquivo de entrada em modo binário, descompactando .gz, .bz2 e .xz em fluxo."""
+        opener = self.COMPRESSED_OPENERS.get(os.path.splitext(filename)[1])
+        if opener is None:
+            return open(filename, 'rb')
+        return opener(filename, 'rb')
+
+    def _iter_input_blocks(self, f, filename):
+        """
+            Como `_read_blocks`, mas, para arquivos compactados, a leitura e a descompressão
+            (que liberam o GIL) rodam em uma thread que mantém até READ_QUEUE_DEPTH blocos
+            prontos, sobrepondo-se à avaliação.
+        """
+        if os.path.splitext(filename)[1] not in self.COMPRESSED_OPENERS:
+            yield from self._read_blocks(f)
+            return
+        blocks = queue.Queue(maxsize=self.READ_QUEUE_DEPTH)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    blocks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False # O consumidor desistiu
+
+        def reader():
+            try:
+                for block in self._read_blocks(f):
+                    if not put(block):
+                        return
+                put(None) # Fim do arquivo
+            except BaseException as e: # Ex.: arquivo corrompido; relançado no consumidor
+                put(e)
+
+        thread = threading.Thread(target=reader, name="rpn-reader", daemon=True)
+        thread.start()
+        try:
+            while True:
+                block = blocks.get()
+                if block is None:
+                    return
+                if isinstance(block, BaseException):
+                    raise block
+                yield block
+        finally:
+            stop.set()
+            thread.join() # O arquivo só pode ser fechado depois que a thread parar
+
+    @staticmethod
+    def _count_lines(text):
+        """Número de linhas de um bloco (a última pode não terminar em '\n')."""
+        if not text:
+            return 0
+        return text.count('\n') + (0 if text.endswith('\n') else 1)
+
+    # --- Modo de Observação (Reavaliação Incremental) ---
+    @staticmethod
+    def _same_value(a, b):
+        """Compara dois resultados exigindo o mesmo tipo (2 e 2.0 são impressos de forma diferente)."""
+        if type(a) is not type(b):
+            return False
+        return a == b or (a != a and b != b) # NaN é igual a NaN para fins de cache
+
+    def _memory_state(self):
+        """Estado completo da memória: a memória sem nome seguida das células nomeadas."""
+        return (self.memory, *self.memory_cells)
+
+    def _restore_memory_state(self, state):
+        self.memory = state[0]
+        self.memory_cells = list(state[1:])
+
+    def _same_state(self, a, b):
+        """Compara dois estados de memória valor a valor (ver `_same_value`)."""
+        return len(a) == len(b) and all(self._same_value(x, y) for x, y in zip(a, b))
+
+    def _same_tail(self, old_results, old_count, size):
+        """
+            Verifica se os últimos `size` resultados atuais são iguais aos últimos `size`
+            dos primeiros `old_count` resultados da avaliação anterior. Se algum dos lados
+            tiver menos de `size` resultados, os tamanhos também precisam coincidir,
+            pois (N RES) falha quando não há resultados suficientes.
+        """
+        if size <= 0:
+            return True
+        current = self.results
+        if (len(current) < size or old_count < size) and len(current) != old_count:
+            return False
+        n = min(size, old_count)
+        for k in range(1, n + 1):
+            if not self._same_value(current[-k], old_results[old_count - k]):
+                return False
+        return True
+
+    def _collect_dependencies(self, node, record):
+        """Registra em `record` o uso de (N RES), (MEM) e (V MEM) na AST."""
+        if isinstance(node, ResAccessNode):
+            record.lookback = max(record.lookback, int(node.index_node.value))
+        elif isinstance(node, MemAccessNode):
+            record.reads_memory = True
+        elif isinstance(node, MemStoreNode):
+            record.writes_memory = True
+        for child in node.children:
+            self._collect_dependencies(child, record)
+
+    def _watch_parse(self, record, line_num):
+        """Analisa uma linha nova ou alterada e coleta suas dependências de RES/MEM."""
+        content = record.text.strip()
+        if not content or content.startswith('#'):
+            return
+        self.current_line_num = line_num
+        record.parsed_line_num = line_num
+        try:
+            record.ast = self._parse_source(content)
+            if record.ast is None:
+                return
+            self._collect_dependencies(record.ast, record)
+        except Exception as e:
+            record.ast = None
+            record.parse_error = str(e)
+
+    def _watch_evaluate(self, record, line_num):
+        """Avalia uma linha a partir do estado atual e guarda suas entradas e saídas."""
+        record.results_before = len(self.results)
+        record.memory_before = self._memory_state()
+        if record.is_blank():
+            record.memory_after = record.memory_before
+            return
+        self.current_line_num = line_num
+        self.current_line_content = record.text.strip()
+        record.result = None
+        record.error = record.parse_error
+        if record.parse_error is None:
+            try:
+                record.result = self._evaluate_line_ast(record.ast)
+            except Exception as e:
+                record.error = str(e)
+        record.memory_after = self._memory_state()
+
+    def _watch_can_reuse(self, record, old_results):
+        """Indica se as entradas de RES/MEM de uma linha não mudaram desde a última avaliação."""
+        if record.is_blank():
+            return True
+        if record.parse_error is not None:
+            return True
+        # Quem grava só pode ser reaproveitado com o mesmo estado de entrada: restaurar
+        # memory_after sobrescreve todas as células, não só as gravadas pela linha
+        if ((record.reads_memory or record.writes_memory)
+                and not self._same_state(self._memory_state(), record.memory_before)):
+            return False
+        if record.writes_memory and record.error is not None:
+            return False # O erro pode ter ocorrido antes ou depois da gravação
+        return self._same_tail(old_results, record.results_before, record.lookback + 1)
+
+    def _watch_report(self, record, line_num):
+        """Imprime o novo resultado (ou erro) de uma linha reavaliada."""
+        if record.is_blank():
+            return
+        if record.parse_error is not None and record.parsed_line_num != line_num:
+            # A linha foi deslocada: reanalisa para que a mensagem cite a linha correta
+            record.parse_error = None
+            self._watch_parse(record, line_num)
+            record.error = record.parse_error
+        if record.error is not None:
+            self.current_line_num = line_num
+            self.current_line_content = record.text.strip()
+            self.generate_error_report(record.error)
+        else:
+            print(f"Linha {line_num}: {record.result}")
+
+    def _watch_update(self, new_texts):
+        """
+            Aplica uma nova versão do arquivo ao estado em cache:
+            1. Encontra o trecho alterado comparando prefixo e sufixo comuns.
+            2. Reanalisa apenas as linhas alteradas.
+            3. Reavalia as linhas alteradas e, no sufixo, apenas as que têm entradas
+               de RES/MEM diferentes, parando assim que o estado converge.
+            Retorna o número de linhas reavaliadas.
+        """
+        old = self._watch_lines
+        old_results = self._watch_results
+        old_n, new_n = len(old), len(new_texts)
+
+        prefix = 0
+        limit = min(old_n, new_n)
+        while prefix < limit and old[prefix].text == new_texts[prefix]:
+            prefix += 1
+        suffix = 0
+        while (suffix < limit - prefix
+               and old[old_n - 1 - suffix].text == new_texts[new_n - 1 - suffix]):
+            suffix += 1
+        if prefix == old_n and prefix == new_n:
+            return 0 # Nada mudou
+
+        region = [WatchLine(text) for text in new_texts[prefix:new_n - suffix]]
+        for offset, record in enumerate(region):
+            self._watch_parse(record, prefix + offset + 1)
+        tail = old[old_n - suffix:]
+        lines = old[:prefix] + region + tail
+
+        # Recalcula o maior lookback de cada sufixo, apenas até onde ele muda
+        for i in range(prefix + len(region) - 1, -1, -1):
+            following = lines[i + 1].suffix_lookback if i + 1 < len(lines) else -1
+            value = max(lines[i].lookback, following)
+            if i < prefix and value == lines[i].suffix_lookback:
+                break
+            lines[i].suffix_lookback = value
+
+        # Restaura o estado imediatamente antes do trecho alterado
+        if prefix < old_n:
+            self.results = old_results[:old[prefix].results_before]
+            self._restore_memory_state(old[prefix].memory_before)
+        else:
+            self.results = list(old_results)
+            self._restore_memory_state(self._watch_memory)
+
+        reevaluated = 0
+        for offset, record in enumerate(region):
+            self._watch_evaluate(record, prefix + offset + 1)
+            self._watch_report(record, prefix + offset + 1)
+            reevaluated += 1
+
+        for offset, record in enumerate(tail):
+            line_num = prefix + len(region) + offset + 1
+            # Convergência: mesmo estado visível pelo restante do arquivo
+            if (self._same_state(self._memory_state(), record.memory_before)
+                    and self._same_tail(old_results, record.results_before, record.suffix_lookback + 1)):
+                shift = len(self.results) - record.results_before
+                self.results.extend(old_results[record.results_before:])
+                if shift:
+                    for remaining in tail[offset:]:
+                        remaining.results_before += shift
+                self._restore_memory_state(self._watch_memory) # O restante do arquivo leva ao mesmo estado final
+                break
+            if self._watch_can_reuse(record, old_results):
+                record.results_before = len(self.results)
+                record.memory_before = self._memory_state()
+                if not record.is_blank() and record.error is None:
+                    self.results.append(record.result)
+                    if record.writes_memory:
+                        self._restore_memory_state(record.memory_after)
+                continue
+            previous = (record.result, record.error)
+            self._watch_evaluate(record, line_num)
+            reevaluated += 1
+            if not (self._same_value(previous[0], record.result) and previous[1] == record.error):
+                self._watch_report(record, line_num)
+        else:
+            self._watch_memory = self._memory_state()
+
+        self._watch_lines = lines
+        self._watch_results = self.results
+        return reevaluated
+
+    def _watch_read(self, filename, last_signature):
+        """
+            Lê o arquivo observado se ele mudou desde `last_signature`.
+            Retorna (nova assinatura, linhas), ou None se não mudou ou está ausente:
+            editores que salvam por renomeação deixam o arquivo ausente por um
+            instante, e a leitura é tentada de novo no próximo intervalo.
+        """
+        try:
+            stat = os.stat(filename)
+            signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if signature == last_signature:
+                return None
+            with open(filename, 'r') as f:
+                return signature, f.read().splitlines()
+        except OSError:
+            return None
+
+    def watch_file(self, filename, interval=0.5):
+        """
+            Observa um arquivo e, a cada alteração, reavalia apenas as linhas modificadas
+            e as linhas cujas entradas de RES/MEM mudaram, imprimindo os novos resultados.
+            Encerra com Ctrl+C.
+        """
+        self.current_file = os.path.basename(filename)
+        print(f"\n---- Observando Arquivo: {self.current_file} (Ctrl+C para sair) ----\n")
+        self.reset_scope()
+        self._watch_lines = []
+        self._watch_results = []
+        self._watch_memory = self._memory_state()
+        last_signature = None
+        try:
+            while True:
+                change = self._watch_read(filename, last_signature)
+                if change is not None:
+                    last_signature, texts = change
+                    started = time.perf_counter()
+                    count = self._watch_update(texts)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    if count:
+                        print(f"-- {count} linha(s) reavaliada(s) em {elapsed:.1f} ms --\n", flush=True)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nObservação encerrada.")
+
     # --- Relatório de Erro (Permanece o mesmo) ---
     def generate_error_report(self, error_msg):
         """
@@ -535,57 +2460,610 @@ class RPNCalculator:
         print("=======================\n")
 
     # --- Processamento de Arquivo (Permanece o mesmo, adaptado para nova avaliação) ---
-    def process_input(self, path):
-        """Processa arquivos ou diretórios."""
+    def _process_line(self, line, writer=None):
+        """Avalia uma linha do arquivo no modo verboso, imprimindo e/ou exportando o resultado."""
+        content = line.strip()
+        if not content or content.startswith('#'):
+            return # Ignora linhas vazias ou comentários
+        # evaluate_expression agora contém toda a lógica de parsing e avaliação para a linha
+        result = self.evaluate_expression(line)
+        if result is not None:
+            print(f"Resultado Final da Linha: {result}\n")
+        else:
+            # O erro já foi reportado por generate_error_report
+            print("Avaliação da linha falhou.\n")
+        if writer is not None:
+            writer.write(self.current_file, self.current_line_num, result, self.last_error)
+
+    def _process_block(self, text, first_line_num, writer=None):
+        """
+            Avalia um bloco de linhas do arquivo conforme o modo (verboso ou silencioso).
+            Gera o número de cada linha avaliada, permitindo checkpoints no meio do bloco.
+        """
+        if self.verbose:
+            lines = text.split('\n')
+            if text.endswith('\n'):
+                lines.pop()
+            for k, line in enumerate(lines):
+                self.current_line_num = first_line_num + k
+                self._process_line(line, writer)
+                yield self.current_line_num
+        else:
+            # Modo silencioso: tokenização do bloco inteiro em uma única passada
+            for line_num, result, error in self._iter_buffer_results(text, first_line_num):
+                if writer is not None:
+                    writer.write(self.current_file, line_num, result, error)
+                yield line_num
+
+    # --- Checkpoint e Retomada ---
+    # Arquivo .ckpt: cabeçalho fixo + memória + células nomeadas, regravado atomicamente a cada checkpoint.
+    # Arquivo .ckpt.res: log binário só de acréscimo com os resultados (todos continuam
+    # alcançáveis por (N RES), pois N é um literal arbitrário).
+    CHECKPOINT_MAGIC = b'RPNC'
+    CHECKPOINT_VERSION = 4
+    # magic, versão, offset, linha, nº resultados, bytes do log, bytes da saída exportada
+    CHECKPOINT_HEADER = struct.Struct('<4sHQQQQQ')
+    NO_OUTPUT = (1 << 64) - 1 # Sem exportador, ou exportando para a saída padrão
+    CHECKPOINT_EVERY = 10000
+
+    @staticmethod
+    def _pack_value(value):
+        """Codifica um resultado em binário compacto: tag de 1 byte + carga."""
+        if value is None:
+            return b'N'
+        if isinstance(value, float):
+            return b'F' + struct.pack('<d', value)
+        if -(1 << 63) <= value < (1 << 63):
+            return b'I' + struct.pack('<q', value)
+        # Inteiro grande (ex.: potência exata no perfil otimizado): bytes com sinal, pois
+        # str() recusa inteiros com mais de 4300 dígitos
+        payload = value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+        return b'B' + struct.pack('<I', len(payload)) + payload
+
+    @staticmethod
+    def _unpack_value(data, i):
+        """Decodifica o valor gravado por `_pack_value` na posição `i`. Retorna (valor, próxima posição)."""
+        tag = data[i:i + 1]
+        i += 1
+        if tag == b'F':
+            return struct.unpack_from('<d', data, i)[0], i + 8
+        elif tag == b'I':
+            return struct.unpack_from('<q', data, i)[0], i + 8
+        elif tag == b'N':
+            return None, i
+        elif tag == b'B':
+            size = struct.unpack_from('<I', data, i)[0]
+            i += 4
+            return int.from_bytes(data[i:i + size], 'little', signed=True), i + size
+        raise ValueError(f"Checkpoint corrompido: tag desconhecida {tag!r}")
+
+    def _unpack_values(self, data):
+        """Decodifica uma sequência de resultados gravados por `_pack_value`."""
+        values = []
+        i, n = 0, len(data)
+        while i < n:
+            value, i = self._unpack_value(data, i)
+            values.append(value)
+        return values
+
+    def _write_checkpoint(self, path, offset, line_num, writer=None):
+        """
+            Grava o estado do avaliador. Os resultados novos são acrescentados ao log
+            (e sincronizados) antes de o cabeçalho ser substituído, de forma que um
+            checkpoint válido sempre referencia dados já persistidos. O mesmo vale para
+            a saída do `writer`, cujo tamanho vai no cabeçalho.
+        """
+        output_bytes = writer.checkpoint() if writer is not None else None
+        pending = self.results[self._checkpoint_logged:]
+        if pending:
+            self._checkpoint_log.write(b''.join(self._pack_value(v) for v in pending))
+        self._checkpoint_log.flush()
+        os.fsync(self._checkpoint_log.fileno())
+        self._checkpoint_logged = len(self.results)
+
+        header = self.CHECKPOINT_HEADER.pack(self.CHECKPOINT_MAGIC, self.CHECKPOINT_VERSION, offset,
+                                             line_num, len(self.results), self._checkpoint_log.tell(),
+                                             self.NO_OUTPUT if output_bytes is None else output_bytes)
+        tmp_path = path + '.tmp'
+        # Células nomeadas, na ordem dos slots: nome (u16 + UTF-8) e valor
+        cells = [struct.pack('<I', len(self.memory_names))]
+        for name, slot in sorted(self.memory_names.items(), key=lambda item: item[1]):
+            encoded = name.encode('utf-8')
+            value = self.memory_cells[slot] if slot < len(self.memory_cells) else 0.0
+            cells.append(struct.pack('<H', len(encoded)) + encoded + self._pack_value(value))
+        with open(tmp_path, 'wb') as f:
+            f.write(header + self._pack_value(self.memory) + b''.join(cells))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _load_checkpoint(self, path):
+        """
+            Restaura `results`, `memory` e as células nomeadas de um checkpoint.
+            Retorna (offset, linha, bytes do log, bytes da saída ou None) para continuar,
+            ou None se não houver checkpoint.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        size = self.CHECKPOINT_HEADER.size
+        magic, version, offset, line_num, count, log_bytes, output_bytes = self.CHECKPOINT_HEADER.unpack_from(data)
+        if magic != self.CHECKPOINT_MAGIC or version != self.CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint inválido ou de versão incompatível: '{path}'")
+        self.memory, position = self._unpack_value(data, size)
+        cell_count = struct.unpack_from('<I', data, position)[0]
+        position += 4
+        self.memory_names = {}
+        self.memory_cells = []
+        for slot in range(cell_count):
+            length = struct.unpack_from('<H', data, position)[0]
+            position += 2
+            self.memory_names[data[position:position + length].decode('utf-8')] = slot
+            position += length
+            value, position = self._unpack_value(data, position)
+            self.memory_cells.append(value)
+        with open(path + '.res', 'rb') as f:
+            self.results = self._unpack_values(f.read(log_bytes))
+        if len(self.results) != count:
+            raise ValueError(f"Checkpoint corrompido: esperados {count} resultados em '{path}.res'")
+        return offset, line_num, log_bytes, None if output_bytes == self.NO_OUTPUT else output_bytes
+
+    def _remove_checkpoint(self, path):
+        """Remove os arquivos de checkpoint após o processamento completo do arquivo."""
+        for name in (path, path + '.res', path + '.tmp'):
+            if os.path.exists(name):
+                os.remove(name)
+
+    # --- Processamento de Arquivo (Permanece o mesmo, adaptado para nova avaliação) ---
+    def _input_files(self, path):
+        """Lista os arquivos de entrada (.txt, possivelmente compactados) de um caminho (arquivo ou diretório), reportando caminhos inválidos."""
         if os.path.isfile(path):
-            if path.endswith('.txt'):
-                self.process_file(path)
-            else:
-                print(f"Erro: '{path}' não é um arquivo .txt")
+            if path.endswith(self.INPUT_SUFFIXES):
+                return [path]
+            print(f"Erro: '{path}' não é um arquivo .txt (ou .txt.gz, .txt.bz2, .txt.xz)")
         elif os.path.isdir(path):
-            for fname in sorted(os.listdir(path)): # Ordena para processamento consistente
-                if fname.endswith('.txt'):
-                    self.process_file(os.path.join(path, fname))
+            return [os.path.join(path, fname) for fname in sorted(os.listdir(path)) # Ordena para processamento consistente
+                    if fname.endswith(self.INPUT_SUFFIXES)]
         else:
             print(f"Erro: '{path}' não encontrado.")
+        return []
+
+    def process_input(self, path, resume=False, checkpoint_every=None, writer=None):
+        """Processa arquivos ou diretórios."""
+        for filename in self._input_files(path):
+            self.process_file(filename, resume=resume, checkpoint_every=checkpoint_every, writer=writer)
 
-    def process_file(self, filename):
+    # --- Processamento Paralelo (--jobs) ---
+    def process_parallel(self, path, jobs, writer=None):
+        """
+            Avalia os arquivos de um caminho em `jobs` processos, sem impressão por linha.
+            Cada processo mantém a sua própria calculadora (e o seu memo) entre os arquivos;
+            com memorização, as linhas puras com laço são compartilhadas entre os processos
+            por um dicionário do Manager. Os resultados são exportados na ordem dos arquivos
+            e os contadores de cada processo são somados aos desta calculadora.
+        """
+        files = self._input_files(path)
+        options = dict(max_steps=self.max_steps, time_limit=self.time_limit,
+                       check_interval=self.check_interval, verbose=False, compiled=self.compiled,
+                       compile_cache_dir=self.compile_cache_dir, memo_size=self.memo_size,
+                       profile=self.profile.name)
+        with Manager() as manager:
+            shared = manager.dict() if self.memo_size else None
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(options, shared)) as pool:
+                for filename, line_results, stats in pool.map(_process_file_worker, files):
+                    self.current_file = os.path.basename(filename)
+                    if writer is not None:
+                        for line_num, result, error in line_results:
+                            writer.write(self.current_file, line_num, result, error)
+                    self.lines_evaluated += stats[0]
+                    self.memo_hits += stats[1]
+                    self.memo_misses += stats[2]
+                    self.memo_shared_hits += stats[3]
+
+    def print_stats(self, file=sys.stderr):
+        """Imprime os contadores de avaliação e a taxa de acerto da memorização."""
+        lines, hits, misses, shared_hits = self.memo_stats()
+        print(f"Estatísticas: {lines} linha(s) avaliada(s).", file=file)
+        if self.memo_size:
+            lookups = hits + misses
+            rate = 100.0 * hits / lookups if lookups else 0.0
+            print(f"Memo: {hits} acerto(s) em {lookups} consulta(s) de linhas puras ({rate:.1f}%), "
+                  f"{shared_hits} no memo compartilhado.", file=file)
+
+    def report_diagnostics(self, file=sys.stderr):
+        """
+            Imprime (arquivo:linha:coluna: mensagem) e esvazia os diagnósticos coletados
+            desde o último relatório. Retorna quantos foram impressos.
+        """
+        if not self.diagnostics:
+            return 0
+        total = self._print_diagnostics([self.diagnostics], file=file)
+        self.diagnostics.clear()
+        return total
+
+    # --- Modo de Fluxo (stdin) ---
+    RESET_MARKER = '#RESET'
+
+    def process_stream(self, stream, reset_marker=RESET_MARKER, writer=None):
+        """
+            Avalia as linhas de um fluxo de texto (ex.: sys.stdin) à medida que chegam, como
+            um único escopo. Uma linha igual a `reset_marker` encerra o arquivo lógico atual:
+            limpa resultados e memória e reinicia a numeração das linhas. Cada resultado é
+            impresso ou exportado e o buffer de saída é esvaziado imediatamente.
+        """
+        self.current_file = '<stdin>'
+        self.reset_scope()
+        if writer is not None:
+            writer.sync() # Cabeçalho (CSV, binário) disponível antes da primeira linha
+        line_num = 0
+        for line in iter(stream.readline, ''): # readline: não espera encher o buffer de leitura
+            if line.strip() == reset_marker:
+                if self.diagnostics is not None:
+                    self.report_diagnostics()
+                self.reset_scope()
+                line_num = 0
+                continue
+            line_num += 1
+            self.current_line_num = line_num
+            if self.verbose:
+                self._process_line(line, writer)
+            else:
+                content = line.strip()
+                if not content or content.startswith('#'):
+                    continue
+                line_result = self._line_result(line_num, content, line.find(content[0]))
+                if writer is not None:
+                    writer.write(self.current_file, line_num, line_result.result, line_result.error)
+            if writer is not None:
+                writer.sync()
+            if self.verbose:
+                sys.stdout.flush()
+        if self.diagnostics is not None:
+            self.report_diagnostics()
+
+    # --- Validação Sintática (--check) ---
+    @staticmethod
+    def _token_column(line, tokens):
+        """Coluna (a partir de 1) em `line` do token que segue `tokens`, os primeiros tokens da linha."""
+        pos = 0
+        n = len(line)
+        for token in tokens:
+            while pos < n and line[pos].isspace():
+                pos += 1
+            if token[0].isalpha(): # upper() pode mudar o tamanho de letras não ASCII
+                while pos < n and (line[pos].isalpha() or line[pos].isdigit()):
+                    pos += 1
+            else:
+                pos += len(token)
+        while pos < n and line[pos].isspace():
+            pos += 1
+        return pos + 1
+
+    def check_source(self, text, file_name, first_line_num=1):
+        """
+            Valida um texto apenas com as análises léxica e sintática, sem avaliar nada.
+            Retorna a lista de Diagnostic com todos os erros encontrados, em ordem de linha.
+            first_line_num: número da primeira linha de `text` (para validar por blocos).
+        """
+        error_columns = {}
+        tokens, line_starts, line_offsets, errors = self._tokenize_buffer(text, error_columns)
+        self.tokens = tokens
+        saved_names, self.memory_names = self.memory_names, {} # Não altera o escopo atual
+        saved_file, self.current_file = self.current_file, file_name
+        # Com a lista de diagnósticos, o parser se recupera e registra todos os erros da linha
+        saved_diagnostics, self.diagnostics = self.diagnostics, []
+        diagnostics = self.diagnostics
+        for k in range(len(line_starts) - 1):
+            start, end = line_starts[k], line_starts[k + 1]
+            line_num = first_line_num + k
+            if start == end and k not in errors:
+                continue # Linha vazia ou comentário
+            line = text[line_offsets[k]:line_offsets[k + 1]].rstrip('\r\n')
+            self.current_line_num = line_num
+            self.current_line_content = line.strip()
+            self._line_indent = len(line) - len(line.lstrip())
+            if k in errors:
+                self._record_lexical_line(start, end, errors[k], error_columns[k])
+                continue
+            self.token_index = start
+            self.token_end = end
+            try:
+                self.parse_line_to_ast()
+            except SyntaxError:
+                pass # Já registrado em diagnostics
+            except Exception as e: # Ex.: RecursionError em aninhamentos muito profundos
+                failed_at = min(self.token_index, end)
+                column = self._token_column(line, tokens[start:failed_at])
+                diagnostics.append(Diagnostic(file_name, line_num, column, str(e)))
+        self.memory_names = saved_names
+        self.current_file = saved_file
+        self.diagnostics = saved_diagnostics
+        self._line_indent = 0
+        self.tokens = [] # Libera os tokens do bloco antes que o próximo seja tokenizado
+        return diagnostics
+
+    def check_file(self, filename):
+        """
+            Valida um arquivo inteiro (ver `check_source`), lido em blocos de linhas
+            completas como na avaliação: a memória não cresce com o tamanho do arquivo.
+        """
+        diagnostics = []
+        line_num = 0
+        with self._open_input(filename) as f:
+            for text, _ in self._iter_input_blocks(f, filename):
+                diagnostics.extend(self.check_source(text, filename, line_num + 1))
+                line_num += self._count_lines(text)
+        return diagnostics
+
+    def check_input(self, path, jobs=None):
+        """
+            Valida os arquivos de um caminho, em paralelo (um processo por núcleo, ou `jobs`)
+            quando há mais de um arquivo, e imprime os erros como arquivo:linha:coluna: mensagem.
+            Retorna (arquivos validados, número de erros).
+        """
+        files = self._input_files(path)
+        if len(files) > 1 and jobs != 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                reports = pool.map(_check_file, files, itertools.repeat(self.profile.name))
+                total = self._print_diagnostics(reports)
+        else:
+            total = self._print_diagnostics(map(self.check_file, files))
+        print(f"{len(files)} arquivo(s) validado(s), {total} erro(s) de sintaxe.")
+        return len(files), total
+
+    @staticmethod
+    def _print_diagnostics(reports, file=None):
+        total = 0
+        for diagnostics in reports:
+            for d in diagnostics:
+                print(f"{d.file}:{d.line}:{d.column}: {d.message}", file=file)
+            total += len(diagnostics)
+        return total
+
+    def process_file(self, filename, resume=False, checkpoint_every=None, writer=None):
         """
             Processa um arquivo linha por linha.
+            writer: ResultWriter que recebe o resultado (ou erro) de cada linha avaliada.
+            checkpoint_every: grava um checkpoint a cada N linhas (None = desativado).
+            resume: continua a partir do último checkpoint do arquivo, se existir,
+            produzindo a mesma saída que a execução original produziria.
         """
         self.current_file = os.path.basename(filename)
-        print(f"\n---- Processando Arquivo: {self.current_file} ----\n")
+        if self.verbose:
+            print(f"\n---- Processando Arquivo: {self.current_file} ----\n")
         
         # Limpa resultados e memória por arquivo, conforme "Cada arquivo de textos é um escopo de aplicação" [cite: 28]
-        self.results = [] 
-        self.memory = 0.0
+        self.reset_scope()
 
-        with open(filename, 'r') as f:
-            lines = f.readlines()
+        checkpoint_path = filename + '.ckpt'
+        if resume and not checkpoint_every:
+            checkpoint_every = self.CHECKPOINT_EVERY
+        offset, line_num, log_bytes = 0, 0, 0
+        if resume:
+            state = self._load_checkpoint(checkpoint_path)
+            if state is not None:
+                offset, line_num, log_bytes, output_bytes = state
+                if writer is not None and output_bytes is not None:
+                    writer.resume_at(output_bytes) # Mantém os registros até o checkpoint
+                print(f"Retomando '{self.current_file}' a partir da linha {line_num + 1}.", file=sys.stderr)
+        if checkpoint_every:
+            self._checkpoint_log = open(checkpoint_path + '.res', 'ab')
+            self._checkpoint_log.truncate(log_bytes) # Descarta resultados gravados após o último cabeçalho
+            self._checkpoint_logged = len(self.results)
 
-        for i, line in enumerate(lines):
-            self.current_line_num = i + 1
-            # evaluate_expression agora contém toda a lógica de parsing e avaliação para a linha
-            result = self.evaluate_expression(line)
-            if result is not None:
-                print(f"Resultado Final da Linha: {result}\n")
-            else:
-                # O erro já foi reportado por generate_error_report
-                if line.strip() and not line.strip().startswith('#'): # Só imprime se não for linha vazia/comentário
-                    print("Avaliação da linha falhou.\n")
+        if self.compiled and not self.verbose and not checkpoint_every and self.diagnostics is None:
+            # Backend compilado: o arquivo inteiro é uma única chamada de função
+            for line_num, result, error in self._iter_compiled_results(filename):
+                if writer is not None:
+                    writer.write(self.current_file, line_num, result, error)
+            return
+
+        try:
+            # Leitura em fluxo, em blocos de linhas completas, conhecendo o offset de cada bloco
+            with self._open_input(filename) as f:
+                f.seek(offset) # Em arquivos compactados, descompacta até o offset
+                checkpoint_line = line_num
+                for text, end_offset in self._iter_input_blocks(f, filename):
+                    # Cursor (posição no texto, linha, offset em bytes) usado só nos checkpoints
+                    cursor_pos, cursor_line, cursor_offset = 0, line_num, offset
+                    for done_line in self._process_block(text, line_num + 1, writer):
+                        if checkpoint_every and done_line - checkpoint_line >= checkpoint_every:
+                            start = cursor_pos
+                            while cursor_line < done_line:
+                                cursor_pos = text.find('\n', cursor_pos) + 1 or len(text)
+                                cursor_line += 1
+                            cursor_offset += len(text[start:cursor_pos].encode('utf-8'))
+                            self._write_checkpoint(checkpoint_path, cursor_offset, done_line, writer)
+                            checkpoint_line = done_line
+                    line_num += self._count_lines(text)
+                    offset = end_offset
+        finally:
+            if checkpoint_every:
+                self._checkpoint_log.close()
+        if checkpoint_every:
+            self._remove_checkpoint(checkpoint_path)
+        if self.diagnostics is not None:
+            self.report_diagnostics() # Todos os erros do arquivo, depois das linhas válidas
+
+class RPNEngine:
+    """
+        Motor compartilhável entre threads. Guarda apenas o que não muda durante a
+        avaliação — configuração (limites, backend), as tabelas da gramática e dos
+        operadores (atributos de classe de RPNCalculator), o código compilado e o memo
+        de linhas puras (protegido por trava) — e cria, a cada chamada, um contexto
+        leve com o estado de parsing e avaliação de um escopo (tokens, linha atual,
+        RES, MEM). Vários escopos podem então ser avaliados ao mesmo tempo, por um pool
+        de threads, contra um único motor já aquecido.
+    """
+    def __init__(self, max_steps=None, time_limit=None, check_interval=1024,
+                 compiled=False, compile_cache_dir=None, memo_size=0, profile='classico'):
+        self._options = dict(max_steps=max_steps, time_limit=time_limit, check_interval=check_interval,
+                             compiled=compiled, compile_cache_dir=compile_cache_dir, memo_size=memo_size,
+                             profile=profile)
+        self._memo = OrderedDict() if memo_size else None
+        self._memo_lock = threading.Lock()
+
+    def context(self):
+        """Cria um contexto de avaliação (uma RPNCalculator silenciosa) ligado aos caches do motor."""
+        context = RPNCalculator(verbose=False, **self._options)
+        if self._memo is not None:
+            context.memo = self._memo
+            context.memo_lock = self._memo_lock
+        return context
+
+    def iter_results(self, source):
+        """Avalia `source` (caminho ou iterável de linhas) em um escopo novo, gerando LineResult."""
+        return self.context().iter_results(source)
+
+    def evaluate_many(self, source):
+        """Versão não preguiçosa de `iter_results`: retorna a lista de LineResult."""
+        return self.context().evaluate_many(source)
 
 # --- Função Principal ---
-def main():
+_worker_calculator = None # Calculadora de cada processo do pool de --jobs
+
+def _init_worker(options, shared_memo):
+    """Cria a calculadora do processo, que persiste (com o seu memo) entre os arquivos."""
+    global _worker_calculator
+    _worker_calculator = RPNCalculator(**options)
+    _worker_calculator.shared_memo = shared_memo
+
+def _process_file_worker(filename):
+    """Avalia um arquivo em um processo do pool de --jobs; retorna resultados e contadores do arquivo."""
+    calculator = _worker_calculator
+    before = calculator.memo_stats()
+    line_results = [tuple(r) for r in calculator.iter_results(filename)]
+    stats = tuple(after - b for after, b in zip(calculator.memo_stats(), before))
+    return filename, line_results, stats
+
+def _check_file(filename, profile='classico'):
+    """Valida um arquivo em um processo do pool de --check."""
+    return RPNCalculator(verbose=False, profile=profile).check_file(filename)
+
+def main(profile='classico'):
     """
-        Função principal.
+        Função principal. `profile` é o perfil de semântica padrão (main_optimized.py
+        usa esta mesma função com 'otimizado').
     """
-    calculator = RPNCalculator()
+    parser = argparse.ArgumentParser(description="Calculadora RPN - Analisador Léxico e Sintático")
+    parser.add_argument("caminho", nargs="?", help="arquivo .txt ou diretório de entrada")
+    parser.add_argument("--max-steps", type=int, default=None,
+                        help="número máximo de nós avaliados por linha")
+    parser.add_argument("--time-limit", type=float, default=None,
+                        help="prazo em segundos para avaliar cada linha")
+    parser.add_argument("--check-interval", type=int, default=1024,
+                        help="intervalo (em nós avaliados) entre verificações do orçamento")
+    parser.add_argument("--watch", action="store_true",
+                        help="observa o arquivo e reavalia apenas as linhas alteradas e seus dependentes")
+    parser.add_argument("--watch-interval", type=float, default=0.5,
+                        help="intervalo em segundos entre verificações do arquivo observado")
+    parser.add_argument("--checkpoint-every", type=int, default=None,
+                        help="grava um checkpoint do estado a cada N linhas")
+    parser.add_argument("--resume", action="store_true",
+                        help="continua cada arquivo a partir do último checkpoint")
+    parser.add_argument("--format", choices=sorted(RESULT_WRITERS), default=None,
+                        help="exporta os resultados neste formato (requer --output)")
+    parser.add_argument("--output", default=None,
+                        help="arquivo de destino dos resultados exportados ('-' = saída padrão)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="não imprime tokens, AST nem resultados de cada linha")
+    parser.add_argument("--compile", action="store_true",
+                        help="com --quiet e --compile-cache, compila cada arquivo para uma única função Python")
+    parser.add_argument("--compile-cache", default=None,
+                        help="diretório para persistir o código compilado entre execuções")
+    parser.add_argument("--stdin", action="store_true",
+                        help="lê as linhas da entrada padrão (o mesmo que o caminho '-')")
+    parser.add_argument("--reset-marker", default=RPNCalculator.RESET_MARKER,
+                        help="linha que reinicia o escopo no modo --stdin (padrão: %(default)s)")
+    parser.add_argument("--memo", type=int, default=0, metavar="N",
+                        help="com --quiet, memoriza até N resultados de linhas puras (sem MEM/RES) entre arquivos")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="com --quiet, avalia os arquivos de um diretório em N processos (e --check)")
+    parser.add_argument("--stats", action="store_true",
+                        help="imprime, ao final, as linhas avaliadas e a taxa de acerto do memo")
+    parser.add_argument("--ast-max-depth", type=int, default=None,
+                        help="profundidade máxima das ASTs impressas e exportadas")
+    parser.add_argument("--ast-max-nodes", type=int, default=None,
+                        help="número máximo de nós das ASTs impressas e exportadas")
+    parser.add_argument("--ast-format", choices=sorted(AST_WRITERS), default=None,
+                        help="exporta a AST de cada linha analisada neste formato (requer --ast-output)")
+    parser.add_argument("--ast-output", default=None, help="arquivo de destino das ASTs exportadas")
+    parser.add_argument("--diagnostics", action="store_true",
+                        help="ao fim de cada arquivo, lista todos os erros de sintaxe (vários por linha) com colunas")
+    parser.add_argument("--profile", choices=sorted(RPNCalculator.PROFILES), default=profile,
+                        help="perfil de semântica da linguagem (padrão: %(default)s)")
+    parser.add_argument("--check", action="store_true",
+                        help="apenas valida a sintaxe (sem avaliar), em paralelo; código de saída 1 se houver erros")
+    args = parser.parse_args()
+    if args.format and not args.output:
+        parser.error("--format requer --output")
+    if args.ast_format and not args.ast_output:
+        parser.error("--ast-format requer --ast-output")
+    if args.ast_format and (args.memo or args.compile):
+        # Linhas respondidas pelo memo ou pelo código compilado não passam pelo parser
+        parser.error("--ast-format não admite --memo nem --compile (a exportação ficaria incompleta)")
+    if args.ast_format or (args.diagnostics and not args.check):
+        args.jobs = 1 # As ASTs e os diagnósticos são produzidos por um único processo
+    if args.jobs and args.jobs > 1 and not args.check and (not args.quiet or args.checkpoint_every or args.resume):
+        parser.error("--jobs requer --quiet e não admite --checkpoint-every/--resume")
+    if args.compile and not args.compile_cache:
+        # Compilar custa várias vezes uma execução interpretada: só compensa se o código sobreviver à execução
+        parser.error("--compile requer --compile-cache (o cache em memória não sobrevive entre execuções)")
+    if args.memo and not args.quiet and not args.check:
+        parser.error("--memo requer --quiet (o modo verboso analisa e imprime cada linha)")
 
-    if len(sys.argv) > 1:
-        path = sys.argv[1]
-        calculator.process_input(path)
-    else:
-        print("Uso: python3 seu_script.py <arquivo_ou_diretorio_entrada>")
+    calculator = RPNCalculator(max_steps=args.max_steps, time_limit=args.time_limit,
+                               check_interval=args.check_interval, verbose=not args.quiet,
+                               compiled=args.compile, compile_cache_dir=args.compile_cache,
+                               memo_size=args.memo, ast_max_depth=args.ast_max_depth,
+                               ast_max_nodes=args.ast_max_nodes, profile=args.profile)
+    if args.ast_format:
+        calculator.ast_writer = AST_WRITERS[args.ast_format](args.ast_output, max_depth=args.ast_max_depth,
+                                                             max_nodes=args.ast_max_nodes)
+    if args.diagnostics:
+        calculator.diagnostics = []
+
+    try:
+        if args.stdin or args.caminho == '-':
+            writer = RESULT_WRITERS[args.format](args.output) if args.format else None
+            try:
+                calculator.process_stream(sys.stdin, reset_marker=args.reset_marker, writer=writer)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                if writer is not None:
+                    writer.close()
+            if args.stats:
+                calculator.print_stats()
+        elif args.caminho and args.check:
+            checked, errors = calculator.check_input(args.caminho, jobs=args.jobs)
+            sys.exit(1 if errors or not checked else 0)
+        elif args.caminho and args.watch:
+            if os.path.isfile(args.caminho):
+                calculator.watch_file(args.caminho, interval=args.watch_interval)
+            else:
+                print(f"Erro: '{args.caminho}' não é um arquivo.")
+        elif args.caminho:
+            # Com --resume, a saída anterior é mantida até o último checkpoint
+            writer = RESULT_WRITERS[args.format](args.output, resume=args.resume) if args.format else None
+            try:
+                if args.jobs and args.jobs > 1:
+                    calculator.process_parallel(args.caminho, args.jobs, writer=writer)
+                else:
+                    calculator.process_input(args.caminho, resume=args.resume,
+                                             checkpoint_every=args.checkpoint_every, writer=writer)
+            finally:
+                if writer is not None:
+                    writer.close()
+            if args.stats:
+                calculator.print_stats()
+        else:
+            print(f"Uso: python3 {os.path.basename(sys.argv[0])} <arquivo_ou_diretorio_entrada>")
+    finally:
+        if calculator.ast_writer is not None:
+            calculator.ast_writer.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file